@@ -0,0 +1,59 @@
+import json
+import os
+from config import DATA_DIR, logger
+
+# Kinds of deferred work: Notion pages to bring to Todoist and Todoist
+# objects to bring to Notion
+BACKLOG_KINDS = ("notion_projects", "notion_tasks",
+                 "todoist_projects", "todoist_items")
+
+
+class Backlog:
+    """Work a time-boxed run had no budget for, synced first by the next run.
+
+    Only IDs are kept: the next run reads the objects' current state and
+    plans them again, so a backlog never replays stale writes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DATA_DIR, "backlog.json")
+        self.pending = {kind: set() for kind in BACKLOG_KINDS}
+        self.deferred = {kind: [] for kind in BACKLOG_KINDS}
+
+    def load(self):
+        """Reads the work deferred by the last run."""
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read the backlog {self.path}: {e}")
+            return self
+        for kind in BACKLOG_KINDS:
+            self.pending[kind] = set(data.get(kind, []))
+        if len(self):
+            logger.info(f"Backlog from the last run: {self.summary(self.pending)}")
+        return self
+
+    def defer(self, kind, id):
+        if id not in self.deferred[kind]:
+            self.deferred[kind].append(id)
+
+    def save(self):
+        """Stores the work deferred by this run, replacing the last run's backlog."""
+        if any(self.deferred.values()):
+            logger.info(f"Deferred to the next run: {self.summary(self.deferred)}")
+        # Write then rename so a crash never leaves a partial file
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.deferred, f)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.pending.values())
+
+    @staticmethod
+    def summary(ids_by_kind):
+        return ", ".join(f"{len(ids)} {kind.replace('_', ' ')}"
+                         for kind, ids in ids_by_kind.items() if ids) or "nothing"
@@ -0,0 +1,126 @@
+"""Micro-benchmark of parsing Notion task pages into records.
+
+Compares the previous representation (a dict per task, deep-copied before
+the sync filled in resolved IDs) with the slotted Task records
+(parse_notion_task, then dataclasses.replace for the tasks whose Todoist
+project has to be resolved) on synthetic pages in the
+shape the Notion API returns. Reports the time per pass and the memory
+held by the parsed tasks.
+
+Usage:
+    python benchmarks/bench_records.py [--count 20000]
+"""
+import argparse
+import copy
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import replace
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from fake_notion import FakeNotion, TASKS_SCHEMA  # noqa: E402
+
+# notion_handler reads its configuration on import; no request is made
+for name in ("NOTION_TOKEN", "TODOIST_API_TOKEN", "NOTION_TASKS_DB_ID",
+             "NOTION_PROJECTS_DB_ID", "NOTION_VARIABLES_DB_ID"):
+    os.environ.setdefault(name, "benchmark")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bench-records-"))
+os.makedirs(os.path.join(os.getcwd(), "logs"), exist_ok=True)
+
+from notion_handler import parse_notion_task, get_notion_priority  # noqa: E402
+
+
+def make_pages(count):
+    """Renders count task pages the way databases.query returns them."""
+    notion = FakeNotion()
+    database_id = notion.add_database(TASKS_SCHEMA)
+    project = notion.add_page(database_id, {})
+    pages = []
+    for i in range(count):
+        properties = {
+            "Task name": {"title": [{"text": {"content": f"Task {i}"}}]},
+            "Status": {"status": {"name": "Not Started"}},
+            "TodoistID": {"rich_text": [{"text": {"content": str(10_000_000 + i)}}]},
+            "Project": {"relation": [{"id": project["id"]}]},
+        }
+        # Tasks created in Notion since the last sync lack the Todoist project
+        if i % 10:
+            properties["TodoistProjectID"] = {"rich_text": [{"text": {"content": "2000"}}]}
+        if i % 3 == 0:
+            properties["Due"] = {"date": {"start": "2030-01-15"}}
+        pages.append(notion.add_page(database_id, properties))
+    return pages
+
+
+def parse_task_dict(page):
+    """The dict parser that parse_notion_task replaced."""
+    properties = page["properties"]
+    return {
+        "notion_id": page["id"],
+        "title": properties["Task name"]["title"][0]["plain_text"] if properties["Task name"]["title"] else "",
+        "status": properties["Status"]["status"]["name"] if properties["Status"]["status"] else "Not Started",
+        "todoist_id": properties["TodoistID"]["rich_text"][0]["plain_text"] if properties["TodoistID"]["rich_text"] else None,
+        "due_date": properties["Due"]["date"]["start"] if properties["Due"]["date"] else None,
+        "project_id": properties["Project"]["relation"][0]["id"] if properties["Project"]["relation"] else None,
+        "todoist_project_id": properties["TodoistProjectID"]["rich_text"][0]["plain_text"] if properties["TodoistProjectID"]["rich_text"] else None,
+        "todoist_parent_id": properties["TodoistParentID"]["rich_text"][0]["plain_text"] if properties["TodoistParentID"]["rich_text"] else None,
+        "parent_id": properties["Parent-task"]["relation"][0]["id"] if properties["Parent-task"]["relation"] else None,
+        "priority": get_notion_priority(properties["Priority"]["select"]["name"] if properties["Priority"]["select"] else None),
+        "last_edited_time": page["last_edited_time"],
+    }
+
+
+def run_dicts(pages):
+    tasks = [parse_task_dict(page) for page in pages]
+    resolved = []
+    for task in tasks:
+        task = copy.deepcopy(task)
+        if not task["todoist_project_id"]:
+            task["todoist_project_id"] = "2000"
+        resolved.append(task)
+    return tasks, resolved
+
+
+def run_records(pages):
+    tasks = [parse_notion_task(page) for page in pages]
+    resolved = [task if task.todoist_project_id else replace(task, todoist_project_id="2000")
+                for task in tasks]
+    return tasks, resolved
+
+
+def measure(run, pages, repeat=3):
+    """Returns (best seconds per pass, bytes held by the result)."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run(pages)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    result = run(pages)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=20000)
+    args = parser.parse_args()
+
+    pages = make_pages(args.count)
+    for name, run in (("dicts + deepcopy", run_dicts), ("records + replace", run_records)):
+        seconds, held = measure(run, pages)
+        print(f"{name:20} {seconds * 1000:8.1f} ms  {held / 1024 / 1024:7.1f} MiB"
+              f"  ({held / args.count:.0f} bytes per task)")
+
+
+if __name__ == "__main__":
+    main()
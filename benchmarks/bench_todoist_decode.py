@@ -0,0 +1,112 @@
+"""Micro-benchmark of decoding a Todoist full-sync response.
+
+Builds a synthetic /sync payload with items and projects shaped like those
+of the Sync API v9 and compares the plain json.loads the client used before
+with the decoders of todoist_decode.py: the standard library and orjson
+followed by stripping unused fields, and msgspec's typed decoding. Reports
+the time per decode and the memory held by the result.
+
+Usage:
+    python benchmarks/bench_todoist_decode.py [--items 10000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+# config is read on import; no request is made
+for name in ("NOTION_TOKEN", "TODOIST_API_TOKEN", "NOTION_TASKS_DB_ID",
+             "NOTION_PROJECTS_DB_ID", "NOTION_VARIABLES_DB_ID"):
+    os.environ.setdefault(name, "benchmark")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bench-decode-"))
+os.makedirs(os.path.join(os.getcwd(), "logs"), exist_ok=True)
+
+import todoist_decode  # noqa: E402
+from todoist_decode import compact_sync_response  # noqa: E402
+
+
+def make_payload(item_count, rng):
+    """Returns a full-sync response body with item_count items, as bytes."""
+    projects = [{
+        "id": str(2200000000 + i), "name": f"Project {i}", "color": "charcoal",
+        "parent_id": None, "child_order": i, "collapsed": False, "shared": False,
+        "can_assign_tasks": False, "is_deleted": False, "is_archived": False,
+        "is_favorite": False, "sync_id": None, "inbox_project": i == 0,
+        "view_style": "list", "v2_id": f"6Jf8VQXxpwv{i:05d}",
+    } for i in range(max(1, item_count // 50))]
+    items = []
+    for i in range(item_count):
+        due = {
+            "date": f"2030-01-{rng.randint(1, 28):02d}", "is_recurring": False,
+            "lang": "en", "string": "Jan 15", "timezone": None,
+        } if rng.random() < 0.3 else None
+        items.append({
+            "id": str(7000000000 + i), "user_id": "2671355",
+            "project_id": rng.choice(projects)["id"],
+            "content": f"Task {i} with a reasonably descriptive title",
+            "description": "Some notes about the task" if rng.random() < 0.2 else "",
+            "priority": rng.randint(1, 4), "due": due, "deadline": None,
+            "parent_id": str(7000000000 + rng.randrange(i)) if i and rng.random() < 0.2 else None,
+            "child_order": i, "section_id": None, "day_order": -1, "collapsed": False,
+            "labels": ["work"] if rng.random() < 0.3 else [], "added_by_uid": "2671355",
+            "assigned_by_uid": None, "responsible_uid": None, "checked": False,
+            "is_deleted": False, "sync_id": None, "completed_at": None,
+            "added_at": "2024-03-01T10:00:00.000000Z", "updated_at": "2024-03-02T10:00:00.000000Z",
+            "duration": None, "v2_id": f"6Jf8VQXxpwv{i:06d}", "v2_parent_id": None,
+            "v2_project_id": "6Jf8VQXxpwv00000", "v2_section_id": None,
+        })
+    return json.dumps({
+        "sync_token": "VRyFHr0Qo3Hr--pzINyT6nax4vW7X2YG5RQlw3lB-6eYOPbSZVJepa62EVhO",
+        "full_sync": True, "temp_id_mapping": {}, "projects": projects, "items": items,
+        "sections": [], "labels": [], "notes": [], "user": {"id": "2671355"},
+    }).encode()
+
+
+def measure(decode, content, repeat=5):
+    """Returns (best seconds per decode, bytes held by the result)."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        decode(content)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    result = decode(content)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=10000)
+    args = parser.parse_args()
+
+    content = make_payload(args.items, random.Random(args.items))
+    print(f"Payload: {args.items} items, {len(content) / 1024 / 1024:.1f} MiB")
+
+    decoders = [
+        ("json.loads (before)", json.loads),
+        ("json + compact", lambda c: compact_sync_response(json.loads(c))),
+    ]
+    if todoist_decode.orjson:
+        orjson = todoist_decode.orjson
+        decoders.append(("orjson + compact", lambda c: compact_sync_response(orjson.loads(c))))
+    if todoist_decode.msgspec:
+        decoders.append(("msgspec typed", todoist_decode.decode_sync_response))
+    for name, decode in decoders:
+        seconds, held = measure(decode, content)
+        print(f"{name:22} {seconds * 1000:8.1f} ms  {held / 1024 / 1024:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
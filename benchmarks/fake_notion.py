@@ -0,0 +1,361 @@
+"""Local stand-in for the parts of the Notion API used by the sync.
+
+Implements databases.query (filters, pagination, filter_properties),
+databases.retrieve, pages.create, pages.update and pages.retrieve, with
+configurable latency and a token-bucket rate limit that answers 429.
+"""
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+TASKS_SCHEMA = {
+    "Task name": "title",
+    "Status": "status",
+    "TodoistID": "rich_text",
+    "TodoistProjectID": "rich_text",
+    "TodoistParentID": "rich_text",
+    "Due": "date",
+    "Project": "relation",
+    "Parent-task": "relation",
+    "Priority": "select",
+    "Last edited time": "last_edited_time",
+}
+
+PROJECTS_SCHEMA = {
+    "Project name": "title",
+    "TodoistID": "rich_text",
+    "Status": "status",
+    "Last edited time": "last_edited_time",
+}
+
+VARIABLES_SCHEMA = {
+    "Name": "title",
+    "Value": "rich_text",
+}
+
+
+def _now():
+    """Returns the current time rounded down to the minute, like Notion's last_edited_time."""
+    return datetime.now(timezone.utc).replace(second=0, microsecond=0).strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+
+def _parse_time(value):
+    value = value.replace("Z", "+00:00")
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _rich_text(content):
+    return [{"type": "text", "text": {"content": content, "link": None}, "plain_text": content}]
+
+
+class NotionApiError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+class FakeNotion:
+    """In-memory Notion workspace holding the tasks, projects and variables databases."""
+
+    def __init__(self, latency=0.0, requests_per_second=None):
+        self.latency = latency
+        self.requests_per_second = requests_per_second
+        self._tokens = requests_per_second or 0
+        self._updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.databases = {}
+        self.pages = {}
+        self.requests = Counter()
+        self._created = itertools.count()
+
+    def add_database(self, schema, database_id=None):
+        database_id = database_id or str(uuid.uuid4())
+        property_ids = {}
+        for index, (name, kind) in enumerate(schema.items()):
+            property_ids[name] = "title" if kind == "title" else f"p{index}"
+        self.databases[database_id] = {
+            "schema": schema, "property_ids": property_ids, "pages": []}
+        return database_id
+
+    def add_page(self, database_id, properties):
+        """Creates a page from API-style property values, bypassing the HTTP layer."""
+        with self.lock:
+            return self._create_page(database_id, properties)
+
+    # --- property conversion ---
+
+    def _convert(self, kind, value):
+        if value is None:
+            return [] if kind in ("title", "rich_text", "relation") else None
+        if kind in ("title", "rich_text"):
+            return [_rich_text(part["text"]["content"])[0] for part in value[kind]]
+        if kind in ("status", "select"):
+            return {"name": value[kind]["name"]} if value[kind] else None
+        if kind == "date":
+            return {"start": value["date"]["start"], "end": None} if value["date"] else None
+        if kind == "relation":
+            return [{"id": rel["id"]} for rel in value["relation"]]
+        raise NotionApiError(400, "validation_error",
+                             f"unsupported property type {kind}")
+
+    def _render(self, page, filter_properties=None):
+        database = self.databases[page["database_id"]]
+        properties = {}
+        for name, kind in database["schema"].items():
+            property_id = database["property_ids"][name]
+            if filter_properties and name not in filter_properties and property_id not in filter_properties:
+                continue
+            value = page["last_edited_time"] if kind == "last_edited_time" else page["values"][name]
+            properties[name] = {"id": property_id, "type": kind, kind: value}
+        return {
+            "object": "page",
+            "id": page["id"],
+            "created_time": page["created_time"],
+            "last_edited_time": page["last_edited_time"],
+            "archived": page["archived"],
+            "parent": {"type": "database_id", "database_id": page["database_id"]},
+            "properties": properties,
+        }
+
+    def _create_page(self, database_id, properties):
+        if database_id not in self.databases:
+            raise NotionApiError(404, "object_not_found",
+                                 f"Could not find database {database_id}")
+        schema = self.databases[database_id]["schema"]
+        values = {name: self._convert(kind, None)
+                  for name, kind in schema.items() if kind != "last_edited_time"}
+        for name, value in (properties or {}).items():
+            if name not in schema:
+                raise NotionApiError(
+                    400, "validation_error", f"{name} is not a property that exists")
+            values[name] = self._convert(schema[name], value)
+        now = _now()
+        page = {
+            "id": str(uuid.uuid4()),
+            "database_id": database_id,
+            "created_time": now,
+            "created_order": next(self._created),
+            "last_edited_time": now,
+            "archived": False,
+            "values": values,
+        }
+        self.pages[page["id"]] = page
+        self.databases[database_id]["pages"].append(page)
+        return self._render(page)
+
+    # --- filters ---
+
+    def _value(self, page, name):
+        schema = self.databases[page["database_id"]]["schema"]
+        kind = schema[name]
+        if kind == "last_edited_time":
+            return page["last_edited_time"]
+        value = page["values"][name]
+        if kind in ("title", "rich_text"):
+            return "".join(part["plain_text"] for part in value)
+        if kind in ("status", "select"):
+            return value["name"] if value else None
+        if kind == "date":
+            return value["start"] if value else None
+        if kind == "relation":
+            return [rel["id"] for rel in value]
+        return value
+
+    def _matches(self, page, filter):
+        if not filter:
+            return True
+        if "and" in filter:
+            return all(self._matches(page, f) for f in filter["and"])
+        if "or" in filter:
+            return any(self._matches(page, f) for f in filter["or"])
+
+        if "timestamp" in filter:
+            value = page[filter["timestamp"]]
+            condition = filter[filter["timestamp"]]
+        else:
+            value = self._value(page, filter["property"])
+            condition = next(v for k, v in filter.items() if k != "property")
+
+        for op, expected in condition.items():
+            if op == "equals" and value != expected:
+                return False
+            if op == "does_not_equal" and value == expected:
+                return False
+            if op == "contains" and expected not in (value or ""):
+                return False
+            if op == "is_empty" and value:
+                return False
+            if op == "is_not_empty" and not value:
+                return False
+            if op in ("on_or_after", "after", "on_or_before", "before"):
+                if not value:
+                    return False
+                left, right = _parse_time(value), _parse_time(expected)
+                if op == "on_or_after" and left < right:
+                    return False
+                if op == "after" and left <= right:
+                    return False
+                if op == "on_or_before" and left > right:
+                    return False
+                if op == "before" and left >= right:
+                    return False
+        return True
+
+    # --- API ---
+
+    def query_database(self, database_id, body, query):
+        if database_id not in self.databases:
+            raise NotionApiError(404, "object_not_found",
+                                 f"Could not find database {database_id}")
+        page_size = min(int(body.get("page_size", 100)), 100)
+        start = int(body.get("start_cursor") or 0)
+        matches = [page for page in self.databases[database_id]["pages"]
+                   if not page["archived"] and self._matches(page, body.get("filter"))]
+        chunk = matches[start:start + page_size]
+        has_more = start + page_size < len(matches)
+        filter_properties = query.get("filter_properties")
+        return {
+            "object": "list",
+            "results": [self._render(page, filter_properties) for page in chunk],
+            "has_more": has_more,
+            "next_cursor": str(start + page_size) if has_more else None,
+        }
+
+    def retrieve_database(self, database_id):
+        if database_id not in self.databases:
+            raise NotionApiError(404, "object_not_found",
+                                 f"Could not find database {database_id}")
+        database = self.databases[database_id]
+        return {
+            "object": "database",
+            "id": database_id,
+            "properties": {
+                name: {"id": database["property_ids"][name],
+                       "name": name, "type": kind}
+                for name, kind in database["schema"].items()
+            },
+        }
+
+    def create_page(self, body):
+        return self._create_page(body["parent"]["database_id"], body.get("properties"))
+
+    def update_page(self, page_id, body):
+        page = self.pages.get(page_id)
+        if not page:
+            raise NotionApiError(404, "object_not_found",
+                                 f"Could not find page {page_id}")
+        schema = self.databases[page["database_id"]]["schema"]
+        for name, value in (body.get("properties") or {}).items():
+            if name not in schema:
+                raise NotionApiError(
+                    400, "validation_error", f"{name} is not a property that exists")
+            page["values"][name] = self._convert(schema[name], value)
+        if "archived" in body:
+            page["archived"] = body["archived"]
+        page["last_edited_time"] = _now()
+        return self._render(page)
+
+    def retrieve_page(self, page_id):
+        page = self.pages.get(page_id)
+        if not page:
+            raise NotionApiError(404, "object_not_found",
+                                 f"Could not find page {page_id}")
+        return self._render(page)
+
+    def _rate_limited(self):
+        if not self.requests_per_second:
+            return False
+        now = time.monotonic()
+        self._tokens = min(self.requests_per_second, self._tokens +
+                           (now - self._updated) * self.requests_per_second)
+        self._updated = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+
+    def handle(self, method, path, query, body):
+        parts = [part for part in path.split("/") if part][1:]  # drop "v1"
+        if method == "POST" and len(parts) == 3 and parts[0] == "databases" and parts[2] == "query":
+            return "databases.query", lambda: self.query_database(parts[1], body, query)
+        if method == "GET" and len(parts) == 2 and parts[0] == "databases":
+            return "databases.retrieve", lambda: self.retrieve_database(parts[1])
+        if method == "POST" and parts == ["pages"]:
+            return "pages.create", lambda: self.create_page(body)
+        if method == "PATCH" and len(parts) == 2 and parts[0] == "pages":
+            return "pages.update", lambda: self.update_page(parts[1], body)
+        if method == "GET" and len(parts) == 2 and parts[0] == "pages":
+            return "pages.retrieve", lambda: self.retrieve_page(parts[1])
+        return "unknown", None
+
+    # --- HTTP ---
+
+    def serve(self, host="127.0.0.1", port=0):
+        """Starts the server on a background thread and returns its base URL."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self, method):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                endpoint, action = fake.handle(method, url.path, query, body)
+                fake.requests[endpoint] += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if action is None:
+                    return self._send(400, {"object": "error", "code": "invalid_request_url", "message": "Invalid request URL."})
+
+                with fake.lock:
+                    if fake._rate_limited():
+                        fake.requests["rate_limited"] += 1
+                        return self._send(429, {"object": "error", "code": "rate_limited", "message": "Rate limited"}, {"Retry-After": "1"})
+                    try:
+                        result = action()
+                    except NotionApiError as e:
+                        return self._send(e.status, {"object": "error", "code": e.code, "message": str(e)})
+                self._send(200, result)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PATCH(self):
+                self._dispatch("PATCH")
+
+            def _send(self, status, body, headers=None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.server.server_port}"
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
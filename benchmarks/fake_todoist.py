@@ -0,0 +1,219 @@
+"""Local stand-in for the parts of the Todoist Sync API v9 used by the sync.
+
+Implements /sync/v9/sync (with sync_token deltas, commands, temp_id_mapping
+and uuid de-duplication), /sync/v9/items/get and /sync/v9/projects/get.
+"""
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeTodoist:
+    """In-memory Todoist account; every change is stamped with a revision used as the sync token."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.revision = 0
+        self.projects = {}
+        self.items = {}
+        self.changed_at = {}  # (kind, id) -> revision of the last change
+        self.applied = {}  # command uuid -> (temp_id, new ID) of applied commands
+        self._ids = itertools.count(1_000_000)
+        self.requests = Counter()
+
+    def new_id(self):
+        return str(next(self._ids))
+
+    def _touch(self, kind, resource_id):
+        self.revision += 1
+        self.changed_at[(kind, resource_id)] = self.revision
+
+    def add_project(self, name):
+        with self.lock:
+            project = {"id": self.new_id(), "name": name,
+                       "is_deleted": False, "is_archived": False}
+            self.projects[project["id"]] = project
+            self._touch("projects", project["id"])
+            return project
+
+    def add_item(self, content, project_id, parent_id=None, due=None, priority=1, checked=False):
+        with self.lock:
+            item = {
+                "id": self.new_id(), "content": content, "project_id": project_id,
+                "parent_id": parent_id, "due": due, "priority": priority,
+                "checked": checked, "is_deleted": False, "description": "",
+                "labels": [], "child_order": 0, "section_id": None,
+            }
+            self.items[item["id"]] = item
+            self._touch("items", item["id"])
+            return item
+
+    def update_item(self, item_id, **fields):
+        with self.lock:
+            self.items[item_id].update(fields)
+            self._touch("items", item_id)
+
+    # --- API ---
+
+    def sync(self, form):
+        sync_token = form.get("sync_token", "*")
+        resource_types = json.loads(form.get("resource_types", "[]"))
+        commands = json.loads(form.get("commands", "[]"))
+
+        with self.lock:
+            temp_id_mapping = {}
+            sync_status = {}
+            for command in commands:
+                if command["uuid"] in self.applied:
+                    # Already applied: answer as before without running it again
+                    temp_id, new_id = self.applied[command["uuid"]]
+                    if temp_id:
+                        temp_id_mapping[temp_id] = new_id
+                    sync_status[command["uuid"]] = "ok"
+                    continue
+                try:
+                    self._run_command(command, temp_id_mapping)
+                    self.applied[command["uuid"]] = (
+                        command.get("temp_id"), temp_id_mapping.get(command.get("temp_id")))
+                    sync_status[command["uuid"]] = "ok"
+                except Exception as e:
+                    sync_status[command["uuid"]] = {
+                        "error_code": 20, "error": str(e)}
+
+            full_sync = sync_token == "*"
+            since = 0 if full_sync else int(sync_token)
+            response = {
+                "sync_token": str(self.revision),
+                "full_sync": full_sync,
+                "temp_id_mapping": temp_id_mapping,
+                "sync_status": sync_status,
+            }
+            for kind in ("projects", "items"):
+                if kind not in resource_types and "all" not in resource_types:
+                    continue
+                store = self.projects if kind == "projects" else self.items
+                if full_sync:
+                    response[kind] = [r for r in store.values()
+                                      if not r["is_deleted"] and not r.get("checked")]
+                else:
+                    response[kind] = [r for r in store.values()
+                                      if self.changed_at[(kind, r["id"])] > since]
+            return response
+
+    def _run_command(self, command, temp_id_mapping):
+        args = dict(command["args"])
+        for key in ("id", "project_id", "parent_id"):
+            if args.get(key) in temp_id_mapping:
+                args[key] = temp_id_mapping[args[key]]
+
+        kind = command["type"]
+        if kind == "project_add":
+            project = {"id": self.new_id(), "name": args["name"],
+                       "is_deleted": False, "is_archived": False}
+            self.projects[project["id"]] = project
+            temp_id_mapping[command["temp_id"]] = project["id"]
+            self._touch("projects", project["id"])
+        elif kind == "project_update":
+            self.projects[args["id"]].update(
+                {k: v for k, v in args.items() if k != "id"})
+            self._touch("projects", args["id"])
+        elif kind == "item_add":
+            if args.get("project_id") and args["project_id"] not in self.projects:
+                raise ValueError(f"unknown project {args['project_id']}")
+            due = args.get("due")
+            if due and "date" not in due:
+                due = {"date": due.get("string"), "string": due.get("string")}
+            item = {
+                "id": self.new_id(), "content": args["content"],
+                "project_id": args.get("project_id"), "parent_id": args.get("parent_id"),
+                "due": due, "priority": args.get("priority", 1), "checked": False,
+                "is_deleted": False, "description": "", "labels": [],
+                "child_order": 0, "section_id": None,
+            }
+            self.items[item["id"]] = item
+            temp_id_mapping[command["temp_id"]] = item["id"]
+            self._touch("items", item["id"])
+        elif kind == "item_update":
+            self.items[args["id"]].update(
+                {k: v for k, v in args.items() if k != "id"})
+            self._touch("items", args["id"])
+        elif kind in ("item_complete", "item_close"):
+            self.items[args["id"]]["checked"] = True
+            self._touch("items", args["id"])
+        elif kind == "item_uncomplete":
+            self.items[args["id"]]["checked"] = False
+            self._touch("items", args["id"])
+        elif kind == "item_move":
+            item = self.items[args["id"]]
+            if args.get("parent_id"):
+                item["parent_id"] = args["parent_id"]
+                item["project_id"] = self.items[args["parent_id"]]["project_id"]
+            elif args.get("project_id"):
+                item["project_id"] = args["project_id"]
+                item["parent_id"] = None
+            self._touch("items", args["id"])
+        else:
+            raise ValueError(f"unsupported command {kind}")
+
+    def get_item(self, form):
+        with self.lock:
+            item = self.items.get(form.get("item_id"))
+            return {"item": item} if item else None
+
+    def get_project(self, form):
+        with self.lock:
+            project = self.projects.get(form.get("project_id"))
+            return {"project": project} if project else None
+
+    # --- HTTP ---
+
+    def serve(self, host="127.0.0.1", port=0):
+        """Starts the server on a background thread and returns its base URL."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = {k: v[0] for k, v in parse_qs(
+                    self.rfile.read(length).decode()).items()}
+                routes = {
+                    "/sync/v9/sync": fake.sync,
+                    "/sync/v9/items/get": fake.get_item,
+                    "/sync/v9/projects/get": fake.get_project,
+                }
+                fake.requests[self.path] += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if self.path not in routes:
+                    return self._send(404, {"error": "not found"})
+                result = routes[self.path](form)
+                if result is None:
+                    return self._send(404, {"error": "not found"})
+                self._send(200, result)
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.server.server_port}"
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,197 @@
+"""Offline scaling benchmark for main.main().
+
+Starts the local Todoist and Notion stand-in servers, seeds synthetic
+workspaces of the requested sizes and runs a cold sync followed by an
+incremental sync (after editing about 1% of the records on each side)
+and a quiet sync with no edits, which should only see the previous run's
+own writes. Each run is a fresh `python` process, as with the hourly cron job.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--sizes 100 1000 10000]
+        [--notion-latency 0.0] [--todoist-latency 0.0] [--notion-rps N]
+        [--output results.json]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from fake_notion import FakeNotion, TASKS_SCHEMA, PROJECTS_SCHEMA, VARIABLES_SCHEMA  # noqa: E402
+from fake_todoist import FakeTodoist  # noqa: E402
+
+
+def seed_workspace(todoist, notion, size, rng):
+    """Fills the fakes with `size` Todoist items plus a tenth as many Notion-only tasks."""
+    projects = [todoist.add_project(f"Project {i}")
+                for i in range(max(1, size // 50))]
+    items_by_project = {project["id"]: [] for project in projects}
+    for i in range(size):
+        project = rng.choice(projects)
+        siblings = items_by_project[project["id"]]
+        parent = rng.choice(siblings) if siblings and rng.random(
+        ) < 0.2 else None
+        due = {"date": f"2030-01-{rng.randint(1, 28):02d}",
+               "string": "soon"} if rng.random() < 0.3 else None
+        item = todoist.add_item(
+            f"Task {i}", project["id"],
+            parent_id=parent["id"] if parent else None,
+            due=due, priority=rng.randint(1, 4),
+        )
+        siblings.append(item)
+
+    notion_project = notion.add_page(notion.projects_db, {
+        "Project name": {"title": [{"text": {"content": "Notion inbox"}}]},
+        "Status": {"status": {"name": "In Progress"}},
+    })
+    notion_tasks = [notion.add_page(notion.tasks_db, {
+        "Task name": {"title": [{"text": {"content": f"Notion task {i}"}}]},
+        "Status": {"status": {"name": "Not Started"}},
+        "Project": {"relation": [{"id": notion_project["id"]}]},
+    }) for i in range(max(1, size // 10))]
+    # Make some tasks subtasks of tasks created after them, so the query
+    # returns children before their parents
+    for child, parent in zip(notion_tasks[0::10], notion_tasks[5::10]):
+        with notion.lock:
+            notion.update_page(child["id"], {"properties": {
+                "Parent-task": {"relation": [{"id": parent["id"]}]}}})
+
+
+def edit_workspace(todoist, notion, rng, fraction=0.01):
+    """Edits about `fraction` of the records on each side."""
+    items = [item for item in todoist.items.values() if not item["checked"]]
+    for item in rng.sample(items, max(1, int(len(items) * fraction))):
+        todoist.update_item(item["id"], content=item["content"] + " (edited)")
+
+    pages = notion.databases[notion.tasks_db]["pages"]
+    for page in rng.sample(pages, max(1, int(len(pages) * fraction))):
+        with notion.lock:
+            notion.update_page(page["id"], {"properties": {
+                "Task name": {"title": [{"text": {"content": "Edited in Notion"}}]}}})
+
+
+def run_sync(workdir, env):
+    """Runs main.main() in a fresh process; returns (wall seconds, peak RSS in KB)."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        cwd=workdir, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise RuntimeError("sync run failed")
+    child = json.loads(result.stdout.strip().splitlines()[-1])
+    return elapsed, child["peak_rss_kb"]
+
+
+def run_size(size, args):
+    rng = random.Random(size)
+    todoist = FakeTodoist(latency=args.todoist_latency)
+    notion = FakeNotion(latency=args.notion_latency,
+                        requests_per_second=args.notion_rps)
+    notion.tasks_db = notion.add_database(TASKS_SCHEMA)
+    notion.projects_db = notion.add_database(PROJECTS_SCHEMA)
+    notion.variables_db = notion.add_database(VARIABLES_SCHEMA)
+    seed_workspace(todoist, notion, size, rng)
+
+    todoist_url = todoist.serve()
+    notion_url = notion.serve()
+    workdir = tempfile.mkdtemp(prefix=f"bench-{size}-")
+    os.makedirs(os.path.join(workdir, "logs"))
+    os.makedirs(os.path.join(workdir, "data"))
+
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": REPO_DIR,
+        "NOTION_TOKEN": "benchmark",
+        "TODOIST_API_TOKEN": "benchmark",
+        "NOTION_TASKS_DB_ID": notion.tasks_db,
+        "NOTION_PROJECTS_DB_ID": notion.projects_db,
+        "NOTION_VARIABLES_DB_ID": notion.variables_db,
+        "TODOIST_API_URL": todoist_url,
+        "NOTION_API_URL": notion_url,
+        "DATA_DIR": os.path.join(workdir, "data"),
+        # Leave rate limiting to the fake server unless one was requested
+        "NOTION_REQUESTS_PER_SECOND": str(args.notion_rps or 1000),
+    })
+
+    results = []
+    try:
+        for run in ("cold", "incremental", "quiet"):
+            if run == "incremental":
+                # Notion stamps edits to the minute, so step into the next
+                # minute for the edits to land after the stored watermark
+                time.sleep(61 - time.time() % 60)
+                edit_workspace(todoist, notion, rng)
+            todoist.requests.clear()
+            notion.requests.clear()
+            elapsed, peak_rss_kb = run_sync(workdir, env)
+            results.append({
+                "size": size,
+                "run": run,
+                "wall_seconds": round(elapsed, 3),
+                "peak_rss_kb": peak_rss_kb,
+                "todoist_requests": dict(todoist.requests),
+                "notion_requests": dict(notion.requests),
+                "notion_pages": len(notion.pages),
+                "todoist_items": len(todoist.items),
+            })
+    finally:
+        todoist.shutdown()
+        notion.shutdown()
+    return results
+
+
+def child():
+    """Entry point of the per-run process."""
+    import main
+    main.main()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"peak_rss_kb": peak}))
+
+
+def print_results(results):
+    print(f"{'size':>6} {'run':<12} {'wall s':>8} {'peak MB':>8} {'todoist req':>12} {'notion req':>11}  notion by endpoint")
+    for result in results:
+        notion_total = sum(result["notion_requests"].values())
+        todoist_total = sum(result["todoist_requests"].values())
+        endpoints = ", ".join(f"{k}={v}" for k, v in sorted(
+            result["notion_requests"].items()))
+        print(f"{result['size']:>6} {result['run']:<12} {result['wall_seconds']:>8.2f} "
+              f"{result['peak_rss_kb'] / 1024:>8.1f} {todoist_total:>12} {notion_total:>11}  {endpoints}")
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        child()
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[100, 1000, 10000])
+    parser.add_argument("--notion-latency", type=float, default=0.0,
+                        help="seconds added to every Notion response")
+    parser.add_argument("--todoist-latency", type=float, default=0.0,
+                        help="seconds added to every Todoist response")
+    parser.add_argument("--notion-rps", type=float, default=None,
+                        help="Notion rate limit in requests per second (default: unlimited)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    all_results = []
+    for size in args.sizes:
+        all_results.extend(run_size(size, args))
+    print_results(all_results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(all_results, f, indent=2)
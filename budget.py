@@ -0,0 +1,51 @@
+import math
+import time
+from metrics import metrics
+
+
+class RunBudget:
+    """Wall-clock deadline and per-service request limits of one sync run.
+
+    Requests are counted from the run's metrics, so everything the run sent
+    (fetches and retries included) uses up the budget. The executors consult
+    it before starting writes and leave the ones that don't fit for the next
+    run.
+    """
+
+    def __init__(self):
+        self.start()
+
+    def start(self, seconds=None, requests=None):
+        """Starts the budget of a run: seconds until the deadline and max requests by service."""
+        self.deadline = time.monotonic() + seconds if seconds is not None else None
+        self.requests = {service: limit for service, limit in (requests or {}).items()
+                         if limit is not None}
+
+    @property
+    def limited(self):
+        return self.deadline is not None or bool(self.requests)
+
+    def time_left(self):
+        if self.deadline is None:
+            return math.inf
+        return self.deadline - time.monotonic()
+
+    def requests_left(self, service):
+        if service not in self.requests:
+            return math.inf
+        used = sum(stats["requests"] for stats in metrics.to_dict()["endpoints"]
+                   if stats["service"] == service)
+        return self.requests[service] - used
+
+    def room(self, service, rate=None):
+        """Returns how many more requests to a service fit, at rate per second before the deadline too."""
+        room = self.requests_left(service)
+        if self.deadline is not None:
+            if self.time_left() <= 0:
+                return 0
+            if rate:
+                room = min(room, math.floor(self.time_left() * rate))
+        return max(room, 0)
+
+
+budget = RunBudget()
@@ -13,6 +13,35 @@ NOTION_TASKS_DB_ID = os.environ["NOTION_TASKS_DB_ID"]
 NOTION_PROJECTS_DB_ID = os.environ["NOTION_PROJECTS_DB_ID"]
 NOTION_VARIABLES_DB_ID = os.environ["NOTION_VARIABLES_DB_ID"]
 
+# API base URLs, overridable to point the sync at local stand-in servers
+TODOIST_API_URL = os.environ.get("TODOIST_API_URL", "https://api.todoist.com")
+NOTION_API_URL = os.environ.get("NOTION_API_URL", "https://api.notion.com")
+
+# Client-side Notion rate limit (Notion allows about 3 requests per second)
+NOTION_REQUESTS_PER_SECOND = float(
+    os.environ.get("NOTION_REQUESTS_PER_SECOND", "3"))
+
+# Results per Notion query request (Notion returns at most 100)
+NOTION_PAGE_SIZE = min(int(os.environ.get("NOTION_PAGE_SIZE", "100")), 100)
+
+# When set, tasks that have been Done for longer than this many days are
+# left out of the Notion prefetch; lookups of such tasks fall back to the
+# ID index and single page reads
+NOTION_DONE_RETENTION_DAYS = int(
+    os.environ.get("NOTION_DONE_RETENTION_DAYS", "0"))
+
+# Directory for local state (ID index, caches, debug dumps)
+DATA_DIR = os.environ.get("DATA_DIR", "data")
+
+# Where the sync token and watermarks are kept: "notion" (variables
+# database) or "file" (DATA_DIR/sync_state.json)
+SYNC_STATE_BACKEND = os.environ.get("SYNC_STATE_BACKEND", "notion")
+
+# Secrets used to verify webhook deliveries (see webhook_server.py): the
+# Todoist app's client secret and the Notion subscription's verification token
+TODOIST_CLIENT_SECRET = os.environ.get("TODOIST_CLIENT_SECRET")
+NOTION_WEBHOOK_SECRET = os.environ.get("NOTION_WEBHOOK_SECRET")
+
 # Set up logging
 # Create a logger
 logger = logging.getLogger(__name__)
@@ -0,0 +1,44 @@
+import hashlib
+import json
+
+# Fingerprints cover only the fields the sync compares. A record whose
+# fingerprint matches the one stored at the last successful sync is
+# unchanged on that side and can be skipped without any lookup.
+
+
+def _digest(values):
+    return hashlib.blake2b(json.dumps(values, separators=(",", ":")).encode(), digest_size=16).hexdigest()
+
+
+def todoist_task_fingerprint(task):
+    """Fingerprint of a TodoistItem: content, due, status, priority, project and parent."""
+    return _digest([
+        task.content,
+        task.due_date,
+        task.checked,
+        task.priority,
+        task.project_id,
+        task.parent_id,
+    ])
+
+
+def notion_task_fingerprint(task):
+    """Fingerprint of a Notion Task: title, due, status, priority, project and parent relations."""
+    return _digest([
+        task.title,
+        task.due_date,
+        task.status,
+        task.priority,
+        task.project_id,
+        task.parent_id,
+    ])
+
+
+def todoist_project_fingerprint(project):
+    """Fingerprint of a Todoist project (its name)."""
+    return _digest([project["name"]])
+
+
+def notion_project_fingerprint(project):
+    """Fingerprint of a Notion Project (its name)."""
+    return _digest([project.name])
@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import threading
+from config import DATA_DIR
+
+
+class IdIndex:
+    """Persistent mapping between Todoist IDs and Notion page IDs for tasks and projects."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS id_map (
+                kind TEXT NOT NULL,
+                todoist_id TEXT NOT NULL,
+                notion_id TEXT NOT NULL,
+                PRIMARY KEY (kind, todoist_id)
+            )"""
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS id_map_notion ON id_map (kind, notion_id)")
+        # Fingerprints of the synced fields as last seen on each side ("todoist" / "notion")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS fingerprints (
+                kind TEXT NOT NULL,
+                side TEXT NOT NULL,
+                todoist_id TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                PRIMARY KEY (kind, side, todoist_id)
+            )"""
+        )
+
+    def get_notion_id(self, kind, todoist_id):
+        """Returns the Notion page ID mapped to a Todoist ID, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT notion_id FROM id_map WHERE kind = ? AND todoist_id = ?",
+                (kind, str(todoist_id))
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_todoist_id(self, kind, notion_id):
+        """Returns the Todoist ID mapped to a Notion page ID, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT todoist_id FROM id_map WHERE kind = ? AND notion_id = ?",
+                (kind, notion_id)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, kind, todoist_id, notion_id):
+        """Records a mapping, replacing any older entry for either ID."""
+        if not todoist_id or not notion_id:
+            return
+        todoist_id = str(todoist_id)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT notion_id FROM id_map WHERE kind = ? AND todoist_id = ?",
+                (kind, todoist_id)
+            ).fetchone()
+            if row and row[0] == notion_id:
+                return
+            self.conn.execute("BEGIN")
+            self.conn.execute(
+                "DELETE FROM id_map WHERE kind = ? AND notion_id = ?", (kind, notion_id))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO id_map (kind, todoist_id, notion_id) VALUES (?, ?, ?)",
+                (kind, todoist_id, notion_id)
+            )
+            self.conn.execute("COMMIT")
+
+    def discard(self, kind, todoist_id):
+        """Removes the entry for a Todoist ID."""
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM id_map WHERE kind = ? AND todoist_id = ?", (kind, str(todoist_id)))
+
+    def get_fingerprint(self, kind, side, todoist_id):
+        """Returns the fingerprint recorded for a record on one side at the last sync, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT fingerprint FROM fingerprints WHERE kind = ? AND side = ? AND todoist_id = ?",
+                (kind, side, str(todoist_id))
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_fingerprint(self, kind, side, todoist_id, fingerprint):
+        """Records the fingerprint of a record on one side after a successful sync."""
+        if not todoist_id:
+            return
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (kind, side, todoist_id, fingerprint) VALUES (?, ?, ?, ?)",
+                (kind, side, str(todoist_id), fingerprint)
+            )
+
+    def replace_all(self, kind, mapping):
+        """Replaces every entry of a kind with the given {todoist_id: notion_id} mapping.
+
+        Returns a (added, changed, removed) tuple compared to the previous contents.
+        """
+        with self._lock:
+            old = dict(self.conn.execute(
+                "SELECT todoist_id, notion_id FROM id_map WHERE kind = ?", (kind,)).fetchall())
+            self.conn.execute("BEGIN")
+            self.conn.execute("DELETE FROM id_map WHERE kind = ?", (kind,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO id_map (kind, todoist_id, notion_id) VALUES (?, ?, ?)",
+                [(kind, str(todoist_id), notion_id)
+                 for todoist_id, notion_id in mapping.items()]
+            )
+            self.conn.execute("COMMIT")
+
+        added = sum(1 for todoist_id in mapping if todoist_id not in old)
+        changed = sum(1 for todoist_id, notion_id in mapping.items()
+                      if todoist_id in old and old[todoist_id] != notion_id)
+        removed = sum(1 for todoist_id in old if todoist_id not in mapping)
+        return added, changed, removed
+
+
+id_index = IdIndex(os.path.join(DATA_DIR, "id_index.sqlite3"))
@@ -0,0 +1,96 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import DATA_DIR
+
+
+class CommandJournal:
+    """Write-ahead log of Todoist commands, so a crashed run can be resumed.
+
+    Every command is recorded as "pending" before it is queued, marked "sent"
+    right before the request that carries it and "done" once Todoist accepted
+    it and its new ID is written back to Notion.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS commands (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                uuid TEXT NOT NULL UNIQUE,
+                command TEXT NOT NULL,
+                notion_id TEXT,
+                state TEXT NOT NULL,
+                result_id TEXT,
+                updated_at REAL NOT NULL
+            )"""
+        )
+
+    def record(self, command, notion_id=None):
+        """Records a command before it is queued."""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO commands (uuid, command, notion_id, state, updated_at) VALUES (?, ?, ?, 'pending', ?)",
+                (command["uuid"], json.dumps(command), notion_id, time.time())
+            )
+
+    def mark_sent(self, commands):
+        """Marks commands as sent, storing their args with temp_ids resolved."""
+        with self._lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "UPDATE commands SET state = 'sent', command = ?, updated_at = ? WHERE uuid = ?",
+                [(json.dumps(command), time.time(), command["uuid"])
+                 for command in commands]
+            )
+            self.conn.execute("COMMIT")
+
+    def mark_done(self, results):
+        """Marks commands as done, given a {uuid: new object ID or None} dict."""
+        with self._lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "UPDATE commands SET state = 'done', result_id = ?, updated_at = ? WHERE uuid = ?",
+                [(result_id, time.time(), command_uuid)
+                 for command_uuid, result_id in results.items()]
+            )
+            self.conn.execute("COMMIT")
+
+    def unfinished(self):
+        """Returns the (command, notion_id) pairs that are not done, in recording order."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT command, notion_id FROM commands WHERE state != 'done' ORDER BY seq").fetchall()
+        return [(json.loads(command), notion_id) for command, notion_id in rows]
+
+    def temp_id_mapping(self):
+        """Returns the temp_id -> ID mapping of the creates that are done."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT command, result_id FROM commands WHERE state = 'done' AND result_id IS NOT NULL").fetchall()
+        mapping = {}
+        for command, result_id in rows:
+            temp_id = json.loads(command).get("temp_id")
+            if temp_id:
+                mapping[temp_id] = result_id
+        return mapping
+
+    def clear_done(self):
+        """Forgets finished commands once nothing is left to resume."""
+        with self._lock:
+            self.conn.execute("BEGIN")
+            pending = self.conn.execute(
+                "SELECT COUNT(*) FROM commands WHERE state != 'done'").fetchone()[0]
+            if not pending:
+                self.conn.execute("DELETE FROM commands")
+            self.conn.execute("COMMIT")
+
+
+journal = CommandJournal(os.path.join(DATA_DIR, "journal.sqlite3"))
@@ -1,64 +1,373 @@
 from datetime import datetime, timezone
-from notion_handler import get_notion_variable, get_notion_tasks, get_notion_projects, update_notion_variable
+from notion_client import APIResponseError
+from notion_handler import (iter_notion_tasks, iter_notion_projects, rebuild_id_index,
+                            prefetch_notion_state, clear_notion_state, notion_state,
+                            get_notion_task_by_id, get_notion_project_by_id)
 from todoist_handler import TodoistSync
-from sync_logic import sync_notion_to_todoist, sync_todoist_to_notion
-from config import TODOIST_TOKEN, logger
-import json
+from sync_logic import sync_notion_to_todoist, sync_todoist_to_notion, merge_sync_results
+from sync_plan import plan_notion_to_todoist, plan_todoist_to_notion, summarize_plan, save_plan
+from sync_state import sync_state_store
+from transport import retry_stats
+from metrics import metrics
+from snapshots import snapshots
+from journal import journal
+from budget import budget
+from backlog import Backlog
+from config import TODOIST_TOKEN, DATA_DIR, logger
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import signal
+import threading
+import time
+import uuid
 
+# Daemon mode polls again after this many seconds when the last cycle made
+# changes, doubling the interval after every idle cycle up to the maximum
+DAEMON_MIN_INTERVAL = 15
+DAEMON_MAX_INTERVAL = 600
 
-def main():
-    logger.info("Starting Notion-Todoist synchronization")
+# Daemon mode reloads the whole Notion databases this often, to notice
+# pages that were deleted (the incremental queries only return edits)
+NOTION_REFRESH_SECONDS = 3600
 
-    try:
-        # Initialize TodoistSync object
-        todoist_api = TodoistSync(TODOIST_TOKEN)
 
-        # get the sync token from Notion variables
-        todoist_api.sync_token = get_notion_variable(
-            "todoist_sync_token") or "*"  # "*" means full sync
+def create_todoist_api(replay=True):
+    """Creates the batching Todoist client, resuming from the local snapshot or with a full sync."""
+    todoist_api = TodoistSync(TODOIST_TOKEN, batch=True, state_path=os.path.join(
+        DATA_DIR, "todoist_state.json"))
+
+    # Resume from the local account snapshot if there is one. Without it,
+    # the stored sync token would only bring the changes since the last run
+    # and the snapshot would never hold the whole account, so it is rebuilt
+    # with a full sync
+    if not todoist_api.load_state():
+        logger.info("No Todoist state snapshot, starting with a full sync")
+        todoist_api.sync_token = "*"
+
+    # Finish what a crashed run left; the commands go out with the first sync
+    if replay:
+        todoist_api.replay_journal()
+    return todoist_api
+
+
+def save_sync_state(store, todoist_api, sync_state):
+    """Stores the Notion watermarks and Todoist sync token for the next run."""
+    sync_state["todoist_sync_token"] = todoist_api.sync_token
+    store.save(sync_state)
+    todoist_api.save_state()
+
+
+def _timed_fetch(name, fetch):
+    with metrics.phase(name):
+        return fetch()
+
+
+def fetch_concurrently(fetches):
+    """Runs independent fetch functions on threads and returns their results by name."""
+    with ThreadPoolExecutor(max_workers=len(fetches)) as executor:
+        futures = {name: executor.submit(_timed_fetch, name, fetch)
+                   for name, fetch in fetches.items()}
+        return {name: future.result() for name, future in futures.items()}
+
 
+def _fetches(todoist_api, sync_state, notion_task_stats, notion_project_stats):
+    """Returns the downloads every pass starts with, by name."""
+    return {
         # Initial sync to get projects and items
-        initial_sync_result = todoist_api.sync()
+        "todoist_sync": todoist_api.sync,
+        "notion_tasks": lambda: list(iter_notion_tasks(
+            sync_state["notion_task_last_updated"], stats=notion_task_stats)),
+        "notion_projects": lambda: list(iter_notion_projects(
+            sync_state["notion_project_last_updated"], stats=notion_project_stats)),
+    }
 
-        json.dump(initial_sync_result, open(
-            "data/todoist_sync_result.json", "w"))
 
-        logger.info("Fetching Notion variables")
-        notion_task_last_updated = get_notion_variable(
-            "notion_task_last_updated") or datetime.min.isoformat()
-        notion_project_last_updated = get_notion_variable(
-            "notion_project_last_updated") or datetime.min.isoformat()
+def _backlog_changes(backlog, notion_tasks, notion_projects, todoist_api):
+    """Adds the Notion pages deferred by the last run to the fetched ones and returns its Todoist objects."""
+    for kind, get_page, records in (("notion_tasks", get_notion_task_by_id, notion_tasks),
+                                    ("notion_projects", get_notion_project_by_id, notion_projects)):
+        fetched = {record.notion_id for record in records}
+        for page_id in backlog.pending[kind] - fetched:
+            try:
+                records.append(get_page(page_id))
+            except APIResponseError as e:
+                logger.warning(f"Dropping page {page_id} from the backlog: {e}")
 
-        logger.info("Fetching Notion tasks")
-        notion_tasks = get_notion_tasks(notion_task_last_updated)
-        logger.info(f"Retrieved {len(notion_tasks)} Notion tasks")
+    # Todoist objects come from the account snapshot; deleted ones are gone
+    return {
+        "projects": [todoist_api.projects[project_id] for project_id in backlog.pending["todoist_projects"]
+                     if project_id in todoist_api.projects],
+        "items": [todoist_api.items[item_id] for item_id in backlog.pending["todoist_items"]
+                  if item_id in todoist_api.items],
+    }
 
-        logger.info("Fetching Notion projects")
-        notion_projects = get_notion_projects(notion_project_last_updated)
-        logger.info(f"Retrieved {len(notion_projects)} Notion projects")
+
+def run_cycle(todoist_api, store, sync_state, keep_notion_state=False, save_idle=True,
+              time_limit=None, request_limits=None):
+    """Runs one synchronization pass and returns the number of items written, or None if it failed.
+
+    The watermarks in sync_state are advanced in place. With
+    keep_notion_state, the prefetched Notion databases stay in memory for the
+    next cycle; without save_idle, the sync state is only stored when
+    something changed. time_limit (seconds) and request_limits (max requests
+    by service, "notion" and "todoist") bound the writes; those that don't
+    fit are saved to the backlog, which the next pass syncs first.
+    """
+    metrics.reset()
+    budget.start(time_limit, request_limits)
+    sync_state["run_id"] = uuid.uuid4().hex
+    logger.info(f"Starting sync run {sync_state['run_id']}")
+    if budget.limited:
+        limits = [f"{time_limit:.0f}s"] if time_limit is not None else []
+        limits += [f"{limit} {service} requests" for service, limit in budget.requests.items()]
+        logger.info(f"Run budget: {', '.join(limits)}")
+    snapshots.start_run(sync_state["run_id"])
+    # Changes made in Notion while this run is in progress are picked up by
+    # the next one; our own writes among them are skipped by their fingerprints
+    run_started = datetime.now(timezone.utc).isoformat()
+    todoist_api.written = {"projects": {}, "items": {}}
+    # Retry the Notion write-backs that failed in the last cycle; their
+    # commands go out again with this cycle's Todoist sync
+    replay = bool(todoist_api.unlinked)
+    todoist_api.unlinked = set()
+    todoist_api.received = []
+    if replay:
+        todoist_api.replay_journal()
+
+    try:
+        notion_task_stats = {}
+        notion_project_stats = {}
+        fetches = _fetches(todoist_api, sync_state,
+                           notion_task_stats, notion_project_stats)
+        # Load the Notion databases once; every lookup by ID or TodoistID
+        # during both sync passes is then answered from memory
+        if not notion_state["loaded"] or time.monotonic() - notion_state["loaded_at"] > NOTION_REFRESH_SECONDS:
+            logger.info("Prefetching Notion projects and tasks")
+            fetches["notion_prefetch"] = prefetch_notion_state
+
+        with metrics.phase("fetch"):
+            fetched = {}
+            # Commands replayed from the journal go out with the Todoist sync,
+            # which writes their TodoistIDs back to Notion. The Notion reads
+            # have to see those IDs, or the creates would be planned again
+            if journal.unfinished():
+                fetched["todoist_sync"] = _timed_fetch(
+                    "todoist_sync", fetches.pop("todoist_sync"))
+            # Otherwise none of the downloads depends on another, so they run
+            # in parallel
+            fetched.update(fetch_concurrently(fetches))
+        initial_sync_result = fetched["todoist_sync"]
+        notion_tasks = fetched["notion_tasks"]
+        notion_projects = fetched["notion_projects"]
+
+        snapshots.write("todoist_sync_result", initial_sync_result)
+
+        # Work deferred by the last run is synced first
+        backlog = Backlog().load()
+        backlog_todoist = _backlog_changes(
+            backlog, notion_tasks, notion_projects, todoist_api)
 
         logger.info("Syncing Notion to Todoist")
-        sync_notion_to_todoist(notion_tasks, notion_projects, todoist_api)
+        with metrics.phase("notion_to_todoist"):
+            sync_notion_to_todoist(
+                notion_tasks, notion_projects, todoist_api, backlog)
         logger.info("Notion to Todoist sync completed")
+        logger.info(
+            f"Retrieved {notion_task_stats['results']} Notion tasks in {notion_task_stats['pages']} pages ({notion_task_stats['bytes']} bytes)")
+        logger.info(
+            f"Retrieved {notion_project_stats['results']} Notion projects in {notion_project_stats['pages']} pages ({notion_project_stats['bytes']} bytes)")
 
         logger.info("Syncing Todoist to Notion")
-        sync_todoist_to_notion(initial_sync_result)
+        with metrics.phase("todoist_to_notion"):
+            # Todoist changes that arrived with any of the run's sync
+            # responses are synced too, those of the intermediate command
+            # batches included, since the sync token has moved past them. The
+            # ones made by our own commands are skipped. Those whose Notion
+            # write-back failed already have a page, which the next run's
+            # journal replay links
+            sync_todoist_to_notion(merge_sync_results(
+                backlog_todoist, *todoist_api.received,
+                exclude=todoist_api.unlinked), backlog=backlog)
         logger.info("Todoist to Notion sync completed")
 
-        # Update Notion variables with new timestamps and sync_token
-        update_notion_variable("notion_task_last_updated",
-                               datetime.now(timezone.utc).isoformat())
-        update_notion_variable("notion_project_last_updated",
-                               datetime.now(timezone.utc).isoformat())
-        update_notion_variable("todoist_sync_token", todoist_api.sync_token)
+        # The watermarks move past the deferred changes, so the backlog is
+        # stored first
+        backlog.save()
+        sync_state["notion_task_last_updated"] = run_started
+        sync_state["notion_project_last_updated"] = run_started
+        changes = sum(counts["processed"]
+                      for counts in metrics.items.values())
+
+        # Store the new timestamps and sync_token
+        if changes or save_idle:
+            with metrics.phase("state_update"):
+                save_sync_state(store, todoist_api, sync_state)
 
         logger.info("Synchronization completed successfully")
+        return changes
+    except Exception as e:
+        logger.error(
+            f"An error occurred during synchronization: {str(e)}", exc_info=True)
+        # The lookup tables may be half updated; reload them next time
+        keep_notion_state = False
+        return None
+    finally:
+        if not keep_notion_state:
+            clear_notion_state()
+        logger.info(f"API requests: {retry_stats.summary()}")
+        try:
+            metrics.write()
+        except OSError as e:
+            logger.error(f"Could not write run metrics: {e}")
+
+
+def main(rebuild_index=False, time_limit=None, request_limits=None):
+    """Runs one synchronization.
+
+    time_limit is a wall-clock deadline in seconds from now and
+    request_limits the max requests by service ("notion", "todoist"); work
+    beyond them is left to the next run (see run_cycle).
+    """
+    started = time.monotonic()
+    logger.info("Starting Notion-Todoist synchronization")
+
+    try:
+        if rebuild_index:
+            logger.info("Rebuilding the Todoist-Notion ID index")
+            rebuild_id_index()
+
+        # Read the sync token and watermarks once for the whole run
+        store = sync_state_store()
+        sync_state = store.load()
+
+        # Initialize TodoistSync object, batching write commands
+        todoist_api = create_todoist_api()
     except Exception as e:
         logger.error(
             f"An error occurred during synchronization: {str(e)}", exc_info=True)
+    else:
+        if time_limit is not None:
+            time_limit -= time.monotonic() - started
+        run_cycle(todoist_api, store, sync_state,
+                  time_limit=time_limit, request_limits=request_limits)
+    logger.info("Synchronization process ended")
+
+
+def dry_run(plan_path="-"):
+    """Fetches both sides and saves the sync plans without writing anything.
+
+    The Notion to Todoist plan covers the Notion changes since the last run
+    and the Todoist to Notion plan the Todoist changes; the writes of the
+    first plan are not known to the second. Unfinished journal commands are
+    left for the next real run.
+    """
+    logger.info("Planning Notion-Todoist synchronization (dry run)")
+    sync_state = sync_state_store().load()
+    todoist_api = create_todoist_api(replay=False)
+    fetches = _fetches(todoist_api, sync_state, {}, {})
+    fetches["notion_prefetch"] = prefetch_notion_state
+    try:
+        with metrics.phase("fetch"):
+            fetched = fetch_concurrently(fetches)
+        with metrics.phase("plan"):
+            plans = {
+                "notion_to_todoist": plan_notion_to_todoist(
+                    fetched["notion_tasks"], fetched["notion_projects"], todoist_api),
+                "todoist_to_notion": plan_todoist_to_notion(fetched["todoist_sync"]),
+            }
+    finally:
+        clear_notion_state()
+    for plan in plans.values():
+        logger.info(f"Planned {summarize_plan(plan)}")
+    save_plan(plans, plan_path)
+
+
+def run_daemon(rebuild_index=False, min_interval=DAEMON_MIN_INTERVAL, max_interval=DAEMON_MAX_INTERVAL,
+               time_limit=None, request_limits=None):
+    """Syncs in a loop, keeping clients, lookup tables and Todoist state warm between cycles.
+
+    Polls again after min_interval seconds when a cycle made changes and backs
+    off up to max_interval while idle. SIGTERM and SIGINT finish the current
+    cycle, store the sync state and exit. time_limit and request_limits
+    apply to every cycle.
+    """
+    logger.info("Starting Notion-Todoist synchronization daemon")
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info(
+            f"Received {signal.Signals(signum).name}, stopping after the current cycle")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    if rebuild_index:
+        logger.info("Rebuilding the Todoist-Notion ID index")
+        rebuild_id_index()
+
+    store = sync_state_store()
+    sync_state = store.load()
+    todoist_api = create_todoist_api()
+    interval = min_interval
+    try:
+        while not stop.is_set():
+            changes = run_cycle(todoist_api, store, sync_state,
+                                keep_notion_state=True, save_idle=False,
+                                time_limit=time_limit, request_limits=request_limits)
+            if changes is None:
+                # The failed cycle may have moved the sync token past Todoist
+                # changes it never synced to Notion; start again from the
+                # stored snapshot and its token, resuming the unfinished
+                # commands from the journal
+                todoist_api = create_todoist_api()
+            interval = min_interval if changes else min(
+                interval * 2, max_interval)
+            logger.info(
+                f"Cycle wrote {changes or 0} items, next sync in {interval}s")
+            stop.wait(interval)
     finally:
-        logger.info("Synchronization process ended")
+        # Idle cycles don't store the sync state, so store it on the way out
+        if sync_state["run_id"]:
+            try:
+                save_sync_state(store, todoist_api, sync_state)
+            except Exception as e:
+                logger.error(f"Could not store the sync state: {e}")
+        clear_notion_state()
+        logger.info("Synchronization daemon stopped")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(
+        description="Synchronize tasks and projects between Notion and Todoist.")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="rebuild the local Todoist-Notion ID index from Notion before syncing")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only plan the writes a sync would make, and print them as JSON")
+    parser.add_argument("--plan-file", default="-",
+                        help="with --dry-run, save the plan to this file instead of printing it")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and sync on an adaptive interval until SIGTERM")
+    parser.add_argument("--min-interval", type=float, default=DAEMON_MIN_INTERVAL,
+                        help="seconds between daemon cycles after changes (default: %(default)s)")
+    parser.add_argument("--max-interval", type=float, default=DAEMON_MAX_INTERVAL,
+                        help="longest wait between idle daemon cycles (default: %(default)s)")
+    parser.add_argument("--time-limit", type=float, default=None,
+                        help="stop starting writes after this many seconds and leave the rest to the next run")
+    parser.add_argument("--max-notion-requests", type=int, default=None,
+                        help="Notion API requests a run may make, fetches included")
+    parser.add_argument("--max-todoist-requests", type=int, default=None,
+                        help="Todoist API requests a run may make, fetches included")
+    args = parser.parse_args()
+    request_limits = {"notion": args.max_notion_requests,
+                      "todoist": args.max_todoist_requests}
+    if args.dry_run:
+        dry_run(args.plan_file)
+    elif args.daemon:
+        run_daemon(rebuild_index=args.rebuild_index,
+                   min_interval=args.min_interval, max_interval=args.max_interval,
+                   time_limit=args.time_limit, request_limits=request_limits)
+    else:
+        main(rebuild_index=args.rebuild_index,
+             time_limit=args.time_limit, request_limits=request_limits)
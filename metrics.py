@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from config import DATA_DIR, logger
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Optional Prometheus textfile-collector output, e.g.
+# /var/lib/node_exporter/textfile_collector/notion_todoist_sync.prom
+PROMETHEUS_FILE = os.environ.get("METRICS_PROMETHEUS_FILE")
+
+
+class Metrics:
+    """Per-run timings, API call counts/latencies and item outcomes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = datetime.now(timezone.utc).isoformat()
+            self.phases = {}
+            self.endpoints = {}
+            self.items = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Times a phase of the run; repeated phases add up."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+            logger.info(f"Phase {name} took {elapsed:.2f}s")
+
+    def _endpoint(self, service, endpoint):
+        key = f"{service}:{endpoint}"
+        if key not in self.endpoints:
+            self.endpoints[key] = {
+                "service": service,
+                "endpoint": endpoint,
+                "requests": 0,
+                "errors": 0,
+                "retries": 0,
+                "retry_seconds": 0.0,
+                "latency_sum": 0.0,
+                "latency_buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+            }
+        return self.endpoints[key]
+
+    def observe_request(self, service, endpoint, seconds, status=None):
+        """Records one HTTP request; status None means it failed without a response."""
+        with self._lock:
+            stats = self._endpoint(service, endpoint)
+            stats["requests"] += 1
+            stats["latency_sum"] += seconds
+            if status is None or status >= 400:
+                stats["errors"] += 1
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    stats["latency_buckets"][index] += 1
+                    break
+            else:
+                stats["latency_buckets"][-1] += 1
+
+    def observe_retry(self, service, endpoint, delay):
+        with self._lock:
+            stats = self._endpoint(service, endpoint)
+            stats["retries"] += 1
+            stats["retry_seconds"] += delay
+
+    def count(self, direction, outcome, n=1):
+        """Counts items by direction ("notion_to_todoist"/"todoist_to_notion") and outcome."""
+        with self._lock:
+            counts = self.items.setdefault(
+                direction, {"processed": 0, "skipped": 0, "errored": 0})
+            counts[outcome] = counts.get(outcome, 0) + n
+
+    def to_dict(self):
+        with self._lock:
+            endpoints = []
+            for stats in self.endpoints.values():
+                buckets = {}
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), stats["latency_buckets"]):
+                    cumulative += count
+                    buckets[str(bound)] = cumulative
+                endpoints.append(
+                    dict(stats, latency_buckets=buckets, latency_sum=round(stats["latency_sum"], 4)))
+            return {
+                "started_at": self.started_at,
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+                "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+                "endpoints": endpoints,
+                "items": {direction: dict(counts) for direction, counts in self.items.items()},
+            }
+
+    def write(self, path=None, prometheus_path=PROMETHEUS_FILE):
+        """Appends this run's metrics as one JSON line and optionally writes a Prometheus textfile."""
+        path = path or os.path.join(DATA_DIR, "metrics.jsonl")
+        data = self.to_dict()
+        with open(path, "a") as f:
+            f.write(json.dumps(data) + "\n")
+
+        if prometheus_path:
+            # Write then rename so the collector never reads a partial file
+            tmp_path = prometheus_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(self.to_prometheus(data))
+            os.replace(tmp_path, prometheus_path)
+        return data
+
+    def to_prometheus(self, data=None):
+        data = data or self.to_dict()
+        lines = [
+            "# HELP notion_todoist_sync_phase_seconds Duration of each sync phase in the last run.",
+            "# TYPE notion_todoist_sync_phase_seconds gauge",
+        ]
+        for name, seconds in data["phases"].items():
+            lines.append(
+                f'notion_todoist_sync_phase_seconds{{phase="{name}"}} {seconds}')
+
+        lines += [
+            "# HELP notion_todoist_sync_api_request_seconds API request latency in the last run.",
+            "# TYPE notion_todoist_sync_api_request_seconds histogram",
+        ]
+        for stats in data["endpoints"]:
+            labels = f'service="{stats["service"]}",endpoint="{stats["endpoint"]}"'
+            for bound, count in stats["latency_buckets"].items():
+                lines.append(
+                    f'notion_todoist_sync_api_request_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(
+                f'notion_todoist_sync_api_request_seconds_sum{{{labels}}} {stats["latency_sum"]}')
+            lines.append(
+                f'notion_todoist_sync_api_request_seconds_count{{{labels}}} {stats["requests"]}')
+
+        for name, key in (("errors", "errors"), ("retries", "retries")):
+            lines += [
+                f"# HELP notion_todoist_sync_api_{name} API request {name} in the last run.",
+                f"# TYPE notion_todoist_sync_api_{name} gauge",
+            ]
+            for stats in data["endpoints"]:
+                lines.append(
+                    f'notion_todoist_sync_api_{name}{{service="{stats["service"]}",endpoint="{stats["endpoint"]}"}} {stats[key]}')
+
+        lines += [
+            "# HELP notion_todoist_sync_items Items handled in the last run by direction and outcome.",
+            "# TYPE notion_todoist_sync_items gauge",
+        ]
+        for direction, counts in data["items"].items():
+            for outcome, count in counts.items():
+                lines.append(
+                    f'notion_todoist_sync_items{{direction="{direction}",outcome="{outcome}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -1,9 +1,41 @@
 from notion_client import Client as NotionClient
-from datetime import datetime, timezone
-from config import NOTION_TOKEN, NOTION_TASKS_DB_ID, NOTION_PROJECTS_DB_ID, NOTION_VARIABLES_DB_ID, logger
+from notion_client import APIResponseError
+from datetime import datetime, timedelta, timezone
+from config import (NOTION_TOKEN, NOTION_API_URL, NOTION_TASKS_DB_ID, NOTION_PROJECTS_DB_ID, NOTION_VARIABLES_DB_ID,
+                    NOTION_PAGE_SIZE, NOTION_DONE_RETENTION_DAYS, logger)
+from id_index import id_index
+from fingerprints import notion_task_fingerprint, notion_project_fingerprint
+from records import Task, Project
+from transport import notion_http_client
+from notion_writer import NotionWriter
+import asyncio
 import json
-
-notion = NotionClient(auth=NOTION_TOKEN)
+import threading
+import time
+
+notion = NotionClient(auth=NOTION_TOKEN, base_url=NOTION_API_URL,
+                      client=notion_http_client())
+
+# The properties the sync reads; queries ask Notion for these only
+TASK_PROPERTIES = ("Task name", "Status", "TodoistID", "TodoistProjectID", "TodoistParentID",
+                   "Due", "Project", "Parent-task", "Priority")
+PROJECT_PROPERTIES = ("Project name", "TodoistID")
+
+# Property IDs by name, per database, from databases.retrieve
+_property_ids = {}
+_property_ids_lock = threading.Lock()
+
+# In-memory lookup tables for the current run, filled by prefetch_notion_state()
+notion_state = {
+    "loaded": False,
+    "loaded_at": None,
+    # False when the prefetch left out long-Done tasks
+    "tasks_complete": False,
+    "tasks_by_todoist_id": {},
+    "tasks_by_notion_id": {},
+    "projects_by_todoist_id": {},
+    "projects_by_notion_id": {},
+}
 
 
 def get_notion_variable(variable_name):
@@ -42,31 +74,54 @@ def update_notion_variable(variable_name, value):
         )
 
 
-def create_notion_task(todoist_task, project_id=None, parent_id=None, todoist_project_id=None):
-    """Creates a new task in the Notion tasks database."""
-
-    logger.info(f"Creating new Notion task: {todoist_task['content']}")
-
+def notion_task_properties(todoist_task, project_id=None, parent_id=None, todoist_project_id=None):
+    """Builds the Notion properties for a new task from a TodoistItem."""
     properties = {
-        "Task name": {"title": [{"text": {"content": todoist_task["content"]}}]},
-        "Status": {"status": {"name": "Done" if todoist_task["checked"] else "Not Started"}},
-        "TodoistID": {"rich_text": [{"text": {"content": todoist_task["id"]}}]},
+        "Task name": {"title": [{"text": {"content": todoist_task.content}}]},
+        "Status": {"status": {"name": "Done" if todoist_task.checked else "Not Started"}},
+        "TodoistID": {"rich_text": [{"text": {"content": todoist_task.id}}]},
         "TodoistProjectID": {"rich_text": [{"text": {"content": str(todoist_project_id)}}]} if todoist_project_id else None,
         # "Due": {"date": {"start": todoist_task["due"]["date"]}} if todoist_task.get("due") else None,
         "Project": {"relation": [{"id": project_id}]} if project_id else None,
         # "Parent-task": {"relation": [{"id": parent_id}]} if parent_id else None
     }
 
-    if todoist_task.get("due"):
-        properties["Due"] = {"date": {"start": todoist_task["due"]["date"]}}
+    if todoist_task.due_date:
+        properties["Due"] = {"date": {"start": todoist_task.due_date}}
 
     if parent_id:
         properties["Parent-task"] = {"relation": [{"id": parent_id}]}
 
+    return properties
+
+
+def create_notion_task(todoist_task, project_id=None, parent_id=None, todoist_project_id=None):
+    """Creates a new task in the Notion tasks database."""
+
+    logger.info(f"Creating new Notion task: {todoist_task.content}")
+
     new_page = notion.pages.create(
         parent={"database_id": NOTION_TASKS_DB_ID},
-        properties=properties
+        properties=notion_task_properties(
+            todoist_task, project_id, parent_id, todoist_project_id)
     )
+    id_index.set("task", todoist_task.id, new_page["id"])
+    _record_notion_write("task", parse_notion_task(new_page))
+    return new_page["id"]
+
+
+async def create_notion_task_async(writer, todoist_task, project_id=None, parent_id=None, todoist_project_id=None):
+    """Creates a new task in the Notion tasks database through a NotionWriter."""
+
+    logger.info(f"Creating new Notion task: {todoist_task.content}")
+
+    new_page = await writer.create_page(
+        NOTION_TASKS_DB_ID,
+        notion_task_properties(
+            todoist_task, project_id, parent_id, todoist_project_id)
+    )
+    id_index.set("task", todoist_task.id, new_page["id"])
+    _record_notion_write("task", parse_notion_task(new_page))
     return new_page["id"]
 
 
@@ -75,40 +130,179 @@ def update_notion_task(page_id=None, properties=None, todoist_id=None):
     logger.info(
         f"Updating Notion task: {page_id}")
     if not page_id:
-        page_id = get_notion_task_by_todoist_id(todoist_id)["notion_id"]
-    notion.pages.update(page_id=page_id, properties=properties)
+        page_id = get_notion_task_id_by_todoist_id(todoist_id)
+    page = notion.pages.update(page_id=page_id, properties=properties)
+    _record_notion_write("task", parse_notion_task(page))
 
 
-def get_notion_tasks(last_updated_date):
-    """Retrieves tasks from the Notion tasks database that have been modified since the given date."""
-    results = notion.databases.query(
-        database_id=NOTION_TASKS_DB_ID,
+async def update_notion_task_async(writer, page_id, properties):
+    """Updates an existing task in the Notion tasks database through a NotionWriter."""
+    logger.info(
+        f"Updating Notion task: {page_id}")
+    page = await writer.update_page(page_id, properties)
+    _record_notion_write("task", parse_notion_task(page))
+
+
+def update_notion_pages(updates):
+    """Applies a list of ("task" | "project", page_id, properties) updates concurrently.
+
+    Returns the positions in updates of the ones that failed.
+    """
+    async def run():
+        async with NotionWriter() as writer:
+            jobs = []
+            for kind, page_id, properties in updates:
+                update = update_notion_task_async if kind == "task" else update_notion_project_async
+                jobs.append((f"{kind} {page_id}", update(
+                    writer, page_id, properties)))
+            return await writer.run_all(jobs)
+
+    if not updates:
+        return []
+    return asyncio.run(run())
+
+
+def notion_property_ids(database_id, names):
+    """Returns the IDs of the named properties of a database, or None if the schema can't be read.
+
+    The schema is retrieved once per database; names it doesn't have are left out.
+    """
+    with _property_ids_lock:
+        if database_id not in _property_ids:
+            try:
+                database = notion.databases.retrieve(database_id=database_id)
+            except APIResponseError as e:
+                logger.warning(
+                    f"Could not read the schema of database {database_id}, querying all properties: {e}")
+                return None
+            _property_ids[database_id] = {
+                name: prop["id"] for name, prop in database["properties"].items()}
+    ids = _property_ids[database_id]
+    return [ids[name] for name in names if name in ids]
+
+
+def _projection(database_id, names):
+    """Returns the databases.query arguments that limit the pages to the named properties."""
+    property_ids = notion_property_ids(database_id, names)
+    return {"filter_properties": property_ids} if property_ids else {}
+
+
+def iter_notion_database(database_id, filter=None, page_size=NOTION_PAGE_SIZE, stats=None, properties=None):
+    """Yields every page of a Notion database query, following has_more/next_cursor.
+
+    Pages are sorted by creation time so the cursor walk stays stable while the
+    sync edits pages (and bumps their last_edited_time) during the iteration.
+    If a stats dict is given it is updated with the page, result and byte counts.
+    With properties, the pages only carry the named properties.
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault("pages", 0)
+    stats.setdefault("results", 0)
+    stats.setdefault("bytes", 0)
+
+    query = {
+        "database_id": database_id,
+        "page_size": page_size,
+        "sorts": [{"timestamp": "created_time", "direction": "ascending"}],
+    }
+    if filter:
+        query["filter"] = filter
+    if properties:
+        query.update(_projection(database_id, properties))
+
+    start_cursor = None
+    while True:
+        if start_cursor:
+            query["start_cursor"] = start_cursor
+        response = notion.databases.query(**query)
+
+        page_bytes = len(json.dumps(response, separators=(",", ":")))
+        stats["pages"] += 1
+        stats["results"] += len(response["results"])
+        stats["bytes"] += page_bytes
+        logger.debug(
+            f"Fetched page {stats['pages']} of database {database_id}: {len(response['results'])} results, {page_bytes} bytes")
+
+        yield from response["results"]
+
+        if not response.get("has_more") or not response.get("next_cursor"):
+            break
+        start_cursor = response["next_cursor"]
+
+    logger.info(
+        f"Read database {database_id}: {stats['results']} results in {stats['pages']} pages, {stats['bytes']} bytes")
+
+
+def _property_value(prop):
+    """Returns the plain value of a page property: text, option name, date start or first relation ID."""
+    kind = prop["type"]
+    value = prop[kind]
+    if kind in ("title", "rich_text"):
+        return value[0]["plain_text"] if value else None
+    if kind in ("status", "select"):
+        return value["name"] if value else None
+    if kind == "date":
+        return value["start"] if value else None
+    if kind == "relation":
+        return value[0]["id"] if value else None
+    return value
+
+
+def _page_value(properties, name):
+    """Returns the plain value of the named property, or None if the page doesn't have it."""
+    prop = properties.get(name)
+    return _property_value(prop) if prop else None
+
+
+def parse_notion_task(page):
+    """Converts a page from the Notion tasks database into a Task."""
+    properties = page["properties"]
+    return Task(
+        notion_id=page["id"],
+        title=_page_value(properties, "Task name") or "",
+        status=_page_value(properties, "Status") or "Not Started",
+        todoist_id=_page_value(properties, "TodoistID") or None,
+        due_date=_page_value(properties, "Due"),
+        project_id=_page_value(properties, "Project"),
+        todoist_project_id=_page_value(properties, "TodoistProjectID") or None,
+        todoist_parent_id=_page_value(properties, "TodoistParentID") or None,
+        parent_id=_page_value(properties, "Parent-task"),
+        priority=get_notion_priority(_page_value(properties, "Priority")),
+        last_edited_time=page["last_edited_time"],
+    )
+
+
+def iter_notion_tasks(last_updated_date, stats=None):
+    """Yields tasks from the Notion tasks database modified since the given date, one query page at a time."""
+    for page in iter_notion_database(
+        NOTION_TASKS_DB_ID,
         filter={
             "property": "Last edited time",
             "last_edited_time": {"on_or_after": last_updated_date}
-        }
-    )
-    tasks = []
-
-    json.dump(results, open("data/notion_tasks.json", "w"))
-    for page in results["results"]:
-        task = {
-            "notion_id": page["id"],
-            "title": page["properties"]["Task name"]["title"][0]["plain_text"] if page["properties"]["Task name"]["title"] else "",
-            "status": page["properties"]["Status"]["status"]["name"] if page["properties"]["Status"]["status"] else "Not Started",
-            "todoist_id": page["properties"]["TodoistID"]["rich_text"][0]["plain_text"] if page["properties"]["TodoistID"]["rich_text"] else None,
-            "due_date": page["properties"]["Due"]["date"]["start"] if page["properties"]["Due"]["date"] else None,
-            "project_id": page["properties"]["Project"]["relation"][0]["id"] if page["properties"]["Project"]["relation"] else None,
-            "todoist_project_id": page["properties"]["TodoistProjectID"]["rich_text"][0]["plain_text"] if page["properties"]["TodoistProjectID"]["rich_text"] else None,
-            "todoist_parent_id": page["properties"]["TodoistParentID"]["rich_text"][0]["plain_text"] if page["properties"]["TodoistParentID"]["rich_text"] else None,
-            "parent_id": page["properties"]["Parent-task"]["relation"][0]["id"] if page["properties"]["Parent-task"]["relation"] else None,
-            "priority": get_notion_priority(page["properties"]["Priority"]["select"]["name"] if page["properties"]["Priority"]["select"] else None),
-            "last_edited_time": page["last_edited_time"],
-        }
-        tasks.append(task)
-
-    # json.dump(tasks, open("tasks.json", "w"))
-    return tasks
+        },
+        stats=stats,
+        properties=TASK_PROPERTIES,
+    ):
+        task = parse_notion_task(page)
+        id_index.set("task", task.todoist_id, task.notion_id)
+        # Keeps lookup tables that outlive a run (daemon mode) up to date
+        _cache_notion_task(task)
+        yield task
+
+
+def get_notion_tasks(last_updated_date):
+    """Retrieves tasks from the Notion tasks database that have been modified since the given date."""
+    return list(iter_notion_tasks(last_updated_date))
+
+
+def notion_project_properties(todoist_project):
+    """Builds the Notion properties for a new project from a Todoist project."""
+    return {
+        "Project name": {"title": [{"text": {"content": todoist_project["name"]}}]},
+        "TodoistID": {"rich_text": [{"text": {"content": todoist_project["id"]}}]},
+        "Status": {"status": {"name": "In Progress"}},
+    }
 
 
 def create_notion_project(todoist_project):
@@ -117,12 +311,21 @@ def create_notion_project(todoist_project):
 
     new_page = notion.pages.create(
         parent={"database_id": NOTION_PROJECTS_DB_ID},
-        properties={
-            "Project name": {"title": [{"text": {"content": todoist_project["name"]}}]},
-            "TodoistID": {"rich_text": [{"text": {"content": todoist_project["id"]}}]},
-            "Status": {"status": {"name": "In Progress"}},
-        }
+        properties=notion_project_properties(todoist_project)
     )
+    id_index.set("project", todoist_project["id"], new_page["id"])
+    _record_notion_write("project", parse_notion_project(new_page))
+    return new_page["id"]
+
+
+async def create_notion_project_async(writer, todoist_project):
+    """Creates a new project in the Notion projects database through a NotionWriter."""
+    logger.info(f"Creating new project: {todoist_project['name']}")
+
+    new_page = await writer.create_page(
+        NOTION_PROJECTS_DB_ID, notion_project_properties(todoist_project))
+    id_index.set("project", todoist_project["id"], new_page["id"])
+    _record_notion_write("project", parse_notion_project(new_page))
     return new_page["id"]
 
 
@@ -131,65 +334,168 @@ def update_notion_project(todoist_project_id=None, properties=None, page_id=None
     logger.info(
         f"Updating Notion project: {todoist_project_id}")
     if not page_id:
-        page_id = get_notion_project_by_todoist_id(
-            todoist_project_id)["notion_id"]
-    notion.pages.update(page_id=page_id, properties=properties)
+        page_id = get_notion_project_id_by_todoist_id(todoist_project_id)
+    page = notion.pages.update(page_id=page_id, properties=properties)
+    _record_notion_write("project", parse_notion_project(page))
 
 
-def get_notion_projects(last_updated_date):
-    """Retrieves projects from the Notion projects database that have been modified since the given date."""
-    results = notion.databases.query(
-        database_id=NOTION_PROJECTS_DB_ID,
+async def update_notion_project_async(writer, page_id, properties):
+    """Updates an existing project in the Notion projects database through a NotionWriter."""
+    logger.info(
+        f"Updating Notion project: {page_id}")
+    page = await writer.update_page(page_id, properties)
+    _record_notion_write("project", parse_notion_project(page))
+
+
+def parse_notion_project(page):
+    """Converts a page from the Notion projects database into a Project."""
+    properties = page["properties"]
+    return Project(
+        notion_id=page["id"],
+        name=_page_value(properties, "Project name") or "",
+        todoist_id=_page_value(properties, "TodoistID") or None,
+    )
+
+
+def iter_notion_projects(last_updated_date, stats=None):
+    """Yields projects from the Notion projects database modified since the given date, one query page at a time."""
+    for page in iter_notion_database(
+        NOTION_PROJECTS_DB_ID,
         filter={
             "property": "Last edited time",
-            "date": {"on_or_after": last_updated_date}
-        }
-    )
+            "last_edited_time": {"on_or_after": last_updated_date}
+        },
+        stats=stats,
+        properties=PROJECT_PROPERTIES,
+    ):
+        project = parse_notion_project(page)
+        id_index.set("project", project.todoist_id, project.notion_id)
+        _cache_notion_project(project)
+        yield project
+
+
+def get_notion_projects(last_updated_date):
+    """Retrieves projects from the Notion projects database that have been modified since the given date."""
+    return list(iter_notion_projects(last_updated_date))
+
+
+def _cache_notion_task(task):
+    """Adds or refreshes a task in the in-memory lookup tables, if they are loaded."""
+    if not notion_state["loaded"]:
+        return
+    old = notion_state["tasks_by_notion_id"].get(task.notion_id)
+    if old and old.todoist_id and old.todoist_id != task.todoist_id:
+        notion_state["tasks_by_todoist_id"].pop(old.todoist_id, None)
+    notion_state["tasks_by_notion_id"][task.notion_id] = task
+    if task.todoist_id:
+        notion_state["tasks_by_todoist_id"][task.todoist_id] = task
+
+
+def _cache_notion_project(project):
+    """Adds or refreshes a project in the in-memory lookup tables, if they are loaded."""
+    if not notion_state["loaded"]:
+        return
+    old = notion_state["projects_by_notion_id"].get(project.notion_id)
+    if old and old.todoist_id and old.todoist_id != project.todoist_id:
+        notion_state["projects_by_todoist_id"].pop(old.todoist_id, None)
+    notion_state["projects_by_notion_id"][project.notion_id] = project
+    if project.todoist_id:
+        notion_state["projects_by_todoist_id"][project.todoist_id] = project
+
+
+def _record_notion_write(kind, record):
+    """Caches a page written by the sync and records its fingerprint as our own edit."""
+    # The write bumps the page's last_edited_time, so the next run fetches it
+    # again; the matching fingerprint lets it be skipped instead of echoed
+    # back. The record is parsed from the page the write returned, so a
+    # later edit in Notion doesn't match
+    if kind == "task":
+        _cache_notion_task(record)
+        fingerprint = notion_task_fingerprint(record)
+    else:
+        _cache_notion_project(record)
+        fingerprint = notion_project_fingerprint(record)
+    id_index.set_fingerprint(kind, "notion", record.todoist_id, fingerprint)
+
+
+def prefetch_notion_state():
+    """Loads the whole Notion projects and tasks databases into the in-memory lookup tables.
+
+    While loaded, the get_notion_*_by_id and get_notion_*_by_todoist_id helpers
+    answer from memory, so a run costs one query per 100 pages instead of one
+    per Todoist item. With NOTION_DONE_RETENTION_DAYS, tasks Done for longer
+    are not loaded and lookups of them go back to the API.
+    """
+    clear_notion_state()
+    projects_by_todoist_id = {}
+    projects_by_notion_id = {}
+    for page in iter_notion_database(NOTION_PROJECTS_DB_ID, properties=PROJECT_PROPERTIES):
+        project = parse_notion_project(page)
+        projects_by_notion_id[project.notion_id] = project
+        if project.todoist_id:
+            projects_by_todoist_id[project.todoist_id] = project
+            id_index.set("project", project.todoist_id,
+                         project.notion_id)
+
+    tasks_filter = None
+    if NOTION_DONE_RETENTION_DAYS:
+        cutoff = datetime.now(timezone.utc) - \
+            timedelta(days=NOTION_DONE_RETENTION_DAYS)
+        tasks_filter = {"or": [
+            {"property": "Status", "status": {"does_not_equal": "Done"}},
+            {"timestamp": "last_edited_time",
+             "last_edited_time": {"on_or_after": cutoff.isoformat()}},
+        ]}
+
+    tasks_by_todoist_id = {}
+    tasks_by_notion_id = {}
+    for page in iter_notion_database(NOTION_TASKS_DB_ID, filter=tasks_filter, properties=TASK_PROPERTIES):
+        task = parse_notion_task(page)
+        tasks_by_notion_id[task.notion_id] = task
+        if task.todoist_id:
+            tasks_by_todoist_id[task.todoist_id] = task
+            id_index.set("task", task.todoist_id, task.notion_id)
+
+    notion_state.update({
+        "loaded": True,
+        "loaded_at": time.monotonic(),
+        "tasks_complete": not tasks_filter,
+        "tasks_by_todoist_id": tasks_by_todoist_id,
+        "tasks_by_notion_id": tasks_by_notion_id,
+        "projects_by_todoist_id": projects_by_todoist_id,
+        "projects_by_notion_id": projects_by_notion_id,
+    })
+    logger.info(
+        f"Prefetched {len(projects_by_notion_id)} Notion projects and {len(tasks_by_notion_id)} Notion tasks")
 
-    json.dump(results, open("data/notion_projects.json", "w"))
-    projects = []
-    for page in results["results"]:
-        todoist_id = None
-        todoist_id_property = page["properties"].get(
-            "TodoistID", {}).get("rich_text", [])
-        if todoist_id_property and todoist_id_property[0].get("plain_text"):
-            todoist_id = todoist_id_property[0]["plain_text"]
 
-        project = {
-            "notion_id": page["id"],
-            "name": page["properties"]["Project name"]["title"][0]["text"]["content"],
-            "todoist_id": todoist_id
-        }
-        projects.append(project)
-    return projects
+def clear_notion_state():
+    """Empties the in-memory lookup tables so lookups go back to the Notion API."""
+    notion_state.update({
+        "loaded": False,
+        "loaded_at": None,
+        "tasks_complete": False,
+        "tasks_by_todoist_id": {},
+        "tasks_by_notion_id": {},
+        "projects_by_todoist_id": {},
+        "projects_by_notion_id": {},
+    })
 
 
 def get_notion_project_by_id(id):
     """Retrieves a project from the Notion projects database by its ID."""
-    project = notion.pages.retrieve(page_id=id)
-    return {
-        "notion_id": project["id"],
-        "name": project["properties"]["Project name"]["title"][0]["text"]["content"],
-        "todoist_id": project["properties"]["TodoistID"]["rich_text"][0]["plain_text"] if project["properties"]["TodoistID"]["rich_text"] else None
-    }
+    if id in notion_state["projects_by_notion_id"]:
+        return notion_state["projects_by_notion_id"][id]
+    return parse_notion_project(notion.pages.retrieve(page_id=id))
 
 
 def get_notion_task_by_id(id):
     """Retrieves a task from the Notion tasks database by its ID."""
-    task = notion.pages.retrieve(page_id=id)
-    return {
-        "notion_id": task["id"],
-        "title": task["properties"]["Task name"]["title"][0]["plain_text"] if task["properties"]["Task name"]["title"] else "",
-        "status": task["properties"]["Status"]["status"]["name"] if task["properties"]["Status"]["status"] else "Not Started",
-        "todoist_id": task["properties"]["TodoistID"]["rich_text"][0]["plain_text"] if task["properties"]["TodoistID"]["rich_text"] else None,
-        "due_date": task["properties"]["Due"]["date"]["start"] if task["properties"]["Due"]["date"] else None,
-        "project_id": task["properties"]["Project"]["relation"][0]["id"] if task["properties"]["Project"]["relation"] else None,
-        "todoist_project_id": task["properties"]["TodoistProjectID"]["rich_text"][0]["plain_text"] if task["properties"]["TodoistProjectID"]["rich_text"] else None,
-        "todoist_parent_id": task["properties"]["TodoistParentID"]["rich_text"][0]["plain_text"] if task["properties"]["TodoistParentID"]["rich_text"] else None,
-        "parent_id": task["properties"]["Parent-task"]["relation"][0]["id"] if task["properties"]["Parent-task"]["relation"] else None,
-        "priority": get_notion_priority(task["properties"]["Priority"]["select"]["name"] if task["properties"]["Priority"]["select"] else None),
-        "last_edited_time": task["last_edited_time"],
-    }
+    if id in notion_state["tasks_by_notion_id"]:
+        return notion_state["tasks_by_notion_id"][id]
+    task = parse_notion_task(notion.pages.retrieve(page_id=id))
+    _cache_notion_task(task)
+    return task
 
 
 def get_notion_priority(priority):
@@ -203,24 +509,58 @@ def get_notion_priority(priority):
             return 2
     return 1
 
+def _get_indexed_page(kind, todoist_id):
+    """Retrieves the page the ID index maps a Todoist ID to.
+
+    Returns None and drops the index entry when it is stale: the page was
+    deleted or archived, or no longer carries the same TodoistID.
+    """
+    notion_id = id_index.get_notion_id(kind, todoist_id)
+    if not notion_id:
+        return None
+
+    try:
+        page = notion.pages.retrieve(page_id=notion_id)
+    except APIResponseError as e:
+        logger.warning(
+            f"Dropping stale {kind} index entry {todoist_id} -> {notion_id}: {e}")
+        id_index.discard(kind, todoist_id)
+        return None
+
+    todoist_id_property = page["properties"].get("TodoistID")
+    page_todoist_id = _property_value(
+        todoist_id_property) if todoist_id_property else None
+    if page.get("archived") or page_todoist_id != str(todoist_id):
+        logger.warning(
+            f"Dropping stale {kind} index entry {todoist_id} -> {notion_id}")
+        id_index.discard(kind, todoist_id)
+        return None
+    return page
+
 # Helper function to get project using todoist project id
 
 
 def get_notion_project_by_todoist_id(todoist_id):
     """Retrieves a project from the Notion projects database by its Todoist ID."""
+    if notion_state["loaded"]:
+        return notion_state["projects_by_todoist_id"].get(str(todoist_id))
+
+    page = _get_indexed_page("project", todoist_id)
+    if page:
+        return parse_notion_project(page)
+
     results = notion.databases.query(
         database_id=NOTION_PROJECTS_DB_ID,
         filter={
             "property": "TodoistID",
             "rich_text": {"equals": todoist_id}
-        }
+        },
+        page_size=1,
+        **_projection(NOTION_PROJECTS_DB_ID, PROJECT_PROPERTIES),
     )
     if results["results"]:
-        return {
-            "notion_id": results["results"][0]["id"],
-            "name": results["results"][0]["properties"]["Project name"]["title"][0]["text"]["content"],
-            "todoist_id": results["results"][0]["properties"]["TodoistID"]["rich_text"][0]["plain_text"]
-        }
+        id_index.set("project", todoist_id, results["results"][0]["id"])
+        return parse_notion_project(results["results"][0])
     return None
 
 # Helper function to get task using todoist task id
@@ -228,25 +568,68 @@ def get_notion_project_by_todoist_id(todoist_id):
 
 def get_notion_task_by_todoist_id(todoist_id):
     """Retrieves a task from the Notion tasks database by its Todoist ID."""
-    results = notion.databases.query(
-        database_id=NOTION_TASKS_DB_ID,
-        filter={
-            "property": "TodoistID",
-            "rich_text": {"equals": todoist_id}
-        }
-    )
-    if results["results"]:
-        return {
-            "notion_id": results["results"][0]["id"],
-            "title": results["results"][0]["properties"]["Task name"]["title"][0]["plain_text"],
-            "status": results["results"][0]["properties"]["Status"]["status"]["name"],
-            "todoist_id": results["results"][0]["properties"]["TodoistID"]["rich_text"][0]["plain_text"],
-            "due_date": results["results"][0]["properties"]["Due"]["date"]["start"] if results["results"][0]["properties"]["Due"]["date"] else None,
-            "project_id": results["results"][0]["properties"]["Project"]["relation"][0]["id"] if results["results"][0]["properties"]["Project"]["relation"] else None,
-            "todoist_project_id": results["results"][0]["properties"]["TodoistProjectID"]["rich_text"][0]["plain_text"] if results["results"][0]["properties"]["TodoistProjectID"]["rich_text"] else None,
-            "todoist_parent_id": results["results"][0]["properties"]["TodoistParentID"]["rich_text"][0]["plain_text"] if results["results"][0]["properties"]["TodoistParentID"]["rich_text"] else None,
-            "parent_id": results["results"][0]["properties"]["Parent-task"]["relation"][0]["id"] if results["results"][0]["properties"]["Parent-task"]["relation"] else None,
-            "priority": get_notion_priority(results["results"][0]["properties"]["Priority"]["select"]["name"] if results["results"][0]["properties"]["Priority"]["select"] else None),
-            "last_edited_time": results["results"][0]["last_edited_time"],
-        }
-    return None
+    if notion_state["loaded"]:
+        task = notion_state["tasks_by_todoist_id"].get(str(todoist_id))
+        if task or notion_state["tasks_complete"]:
+            return task
+
+    page = _get_indexed_page("task", todoist_id)
+    if not page:
+        results = notion.databases.query(
+            database_id=NOTION_TASKS_DB_ID,
+            filter={
+                "property": "TodoistID",
+                "rich_text": {"equals": todoist_id}
+            },
+            page_size=1,
+            **_projection(NOTION_TASKS_DB_ID, TASK_PROPERTIES),
+        )
+        if not results["results"]:
+            return None
+        page = results["results"][0]
+        id_index.set("task", todoist_id, page["id"])
+    task = parse_notion_task(page)
+    _cache_notion_task(task)
+    return task
+
+
+def get_notion_project_id_by_todoist_id(todoist_id):
+    """Returns the Notion page ID of a project by its Todoist ID, using the ID index before querying Notion."""
+    if notion_state["loaded"]:
+        project = notion_state["projects_by_todoist_id"].get(str(todoist_id))
+        return project.notion_id if project else None
+
+    notion_id = id_index.get_notion_id("project", todoist_id)
+    if notion_id:
+        return notion_id
+    project = get_notion_project_by_todoist_id(todoist_id)
+    return project.notion_id if project else None
+
+
+def get_notion_task_id_by_todoist_id(todoist_id):
+    """Returns the Notion page ID of a task by its Todoist ID, using the ID index before querying Notion."""
+    if notion_state["loaded"]:
+        task = notion_state["tasks_by_todoist_id"].get(str(todoist_id))
+        if task or notion_state["tasks_complete"]:
+            return task.notion_id if task else None
+
+    notion_id = id_index.get_notion_id("task", todoist_id)
+    if notion_id:
+        return notion_id
+    task = get_notion_task_by_todoist_id(todoist_id)
+    return task.notion_id if task else None
+
+
+def rebuild_id_index():
+    """Rebuilds the ID index from a full read of the Notion tasks and projects databases."""
+    for kind, database_id in (("project", NOTION_PROJECTS_DB_ID), ("task", NOTION_TASKS_DB_ID)):
+        mapping = {}
+        for page in iter_notion_database(database_id, properties=("TodoistID",)):
+            todoist_id_property = page["properties"].get(
+                "TodoistID", {}).get("rich_text", [])
+            if todoist_id_property and todoist_id_property[0].get("plain_text"):
+                mapping[todoist_id_property[0]["plain_text"]] = page["id"]
+
+        added, changed, removed = id_index.replace_all(kind, mapping)
+        logger.info(
+            f"Rebuilt {kind} ID index: {len(mapping)} entries ({added} added, {changed} changed, {removed} stale removed)")
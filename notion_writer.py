@@ -0,0 +1,58 @@
+import asyncio
+from notion_client import AsyncClient
+from transport import notion_async_http_client
+from config import NOTION_TOKEN, NOTION_API_URL, logger
+
+# Maximum number of page writes in flight at once
+NOTION_WRITE_CONCURRENCY = 5
+
+
+class NotionWriter:
+    """Runs Notion page creates and updates concurrently.
+
+    Requests go through the process-wide Notion rate limit of the transport
+    (transport.notion_limiter). Use as an async context manager; the
+    underlying AsyncClient is opened and closed with it, so one writer
+    belongs to one event loop.
+    """
+
+    def __init__(self, concurrency=NOTION_WRITE_CONCURRENCY):
+        self.concurrency = concurrency
+        self.client = None
+
+    async def __aenter__(self):
+        self.client = AsyncClient(
+            auth=NOTION_TOKEN, base_url=NOTION_API_URL, client=notion_async_http_client())
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.client.aclose()
+        self.client = None
+
+    async def create_page(self, database_id, properties):
+        """Creates a page in a database and returns it."""
+        async with self._semaphore:
+            return await self.client.pages.create(
+                parent={"database_id": database_id},
+                properties=properties
+            )
+
+    async def update_page(self, page_id, properties):
+        """Updates the properties of a page and returns it."""
+        async with self._semaphore:
+            return await self.client.pages.update(page_id=page_id, properties=properties)
+
+    async def run_all(self, jobs):
+        """Runs a list of (label, coroutine) jobs concurrently, logging each failure.
+
+        Returns the positions in jobs of the ones that failed.
+        """
+        results = await asyncio.gather(
+            *(coroutine for _, coroutine in jobs), return_exceptions=True)
+        failed = []
+        for index, ((label, _), result) in enumerate(zip(jobs, results)):
+            if isinstance(result, Exception):
+                failed.append(index)
+                logger.error(f"Error syncing {label}: {result}")
+        return failed
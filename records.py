@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+from typing import Optional
+
+# Immutable records for the objects the sync compares. They use __slots__,
+# so tens of thousands of them take a fraction of the memory of the page
+# dicts they are parsed from; derived values are computed into new records
+# (dataclasses.replace) or local variables instead of edited in place. The
+# slots are listed by hand, as dataclass(slots=True) needs Python 3.10.
+
+
+class _Record:
+    """Pickling and copying support for frozen dataclasses with __slots__."""
+    __slots__ = ()
+
+    def __getstate__(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
+
+
+@dataclass(frozen=True)
+class Task(_Record):
+    """A page of the Notion tasks database."""
+    __slots__ = ("notion_id", "title", "status", "todoist_id", "due_date", "project_id",
+                 "todoist_project_id", "todoist_parent_id", "parent_id", "priority",
+                 "last_edited_time")
+
+    notion_id: str
+    title: str
+    status: str
+    todoist_id: Optional[str]
+    due_date: Optional[str]
+    project_id: Optional[str]
+    todoist_project_id: Optional[str]
+    todoist_parent_id: Optional[str]
+    parent_id: Optional[str]
+    priority: int
+    last_edited_time: Optional[str]
+
+
+@dataclass(frozen=True)
+class Project(_Record):
+    """A page of the Notion projects database."""
+    __slots__ = ("notion_id", "name", "todoist_id")
+
+    notion_id: str
+    name: str
+    todoist_id: Optional[str]
+
+
+@dataclass(frozen=True)
+class TodoistItem(_Record):
+    """The fields of a Todoist item the sync compares."""
+    __slots__ = ("id", "content", "project_id", "parent_id", "due_date", "priority",
+                 "checked")
+
+    id: str
+    content: str
+    project_id: Optional[str]
+    parent_id: Optional[str]
+    due_date: Optional[str]
+    priority: Optional[int]
+    checked: bool
+
+    @classmethod
+    def from_api(cls, item):
+        """Builds a record from an item of a Todoist API response."""
+        return cls(
+            id=item["id"],
+            content=item["content"],
+            project_id=item.get("project_id"),
+            parent_id=item.get("parent_id"),
+            due_date=item["due"]["date"] if item.get("due") else None,
+            priority=item.get("priority"),
+            checked=bool(item.get("checked")),
+        )
@@ -0,0 +1,75 @@
+import gzip
+import json
+import os
+import shutil
+import threading
+import uuid
+from config import DATA_DIR, logger
+
+# Debug snapshots of API responses are off unless SNAPSHOTS=1. They are
+# written gzip-compressed to DATA_DIR/snapshots/<run_id>/, keeping the last
+# SNAPSHOT_RUNS runs and the last SNAPSHOT_KEEP snapshots of each name per
+# run (e.g. the responses of the command batches)
+SNAPSHOTS_ENABLED = os.environ.get("SNAPSHOTS", "").lower() in ("1", "true", "yes")
+SNAPSHOT_RUNS = int(os.environ.get("SNAPSHOT_RUNS", "5"))
+SNAPSHOT_KEEP = int(os.environ.get("SNAPSHOT_KEEP", "3"))
+
+
+class Snapshots:
+    """Optional compressed copies of API responses, rotated per run."""
+
+    def __init__(self, root, enabled=SNAPSHOTS_ENABLED, runs=SNAPSHOT_RUNS, keep=SNAPSHOT_KEEP):
+        self.root = root
+        self.enabled = enabled
+        self.runs = runs
+        self.keep = keep
+        self._lock = threading.Lock()
+        self.run_dir = None
+        self.counts = {}
+
+    def start_run(self, run_id):
+        """Starts a snapshot directory for the run and removes those of older runs."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._start_run(run_id)
+
+    def _start_run(self, run_id):
+        os.makedirs(self.root, exist_ok=True)
+        self.run_dir = os.path.join(self.root, run_id)
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.counts = {}
+
+        run_dirs = sorted(
+            (entry for entry in os.scandir(self.root) if entry.is_dir()),
+            key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in run_dirs[max(self.runs, 1):]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    def write(self, name, data):
+        """Streams data as gzipped JSON to <name>-<n>.json.gz, dropping the oldest beyond the limit."""
+        if not self.enabled:
+            return
+        try:
+            with self._lock:
+                if not self.run_dir:
+                    self._start_run(uuid.uuid4().hex)
+                n = self.counts.get(name, 0)
+                self.counts[name] = n + 1
+                path = os.path.join(self.run_dir, f"{name}-{n}.json.gz")
+                # Written then renamed, so a snapshot is never half written
+                tmp_path = path + ".tmp"
+                with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+                    for chunk in json.JSONEncoder().iterencode(data):
+                        f.write(chunk)
+                os.replace(tmp_path, path)
+
+                old_path = os.path.join(
+                    self.run_dir, f"{name}-{n - self.keep}.json.gz")
+                if n >= self.keep and os.path.exists(old_path):
+                    os.remove(old_path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not write snapshot {name}: {e}")
+
+
+snapshots = Snapshots(os.path.join(DATA_DIR, "snapshots"))
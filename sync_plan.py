@@ -0,0 +1,641 @@
+"""Sync plans: the writes a sync pass will make, decided before any is made.
+
+The planners compare the fetched Todoist and Notion state and return a
+plan: a JSON-serializable dict of operations, the fingerprints to record and
+the number of items skipped. With the Notion databases prefetched and the
+Todoist state loaded they make no requests. The executors then make the
+writes, grouped by operation type: Todoist commands go out in batches,
+Notion pages are written concurrently, projects first and then tasks level
+by level. Within a level the most urgent work comes first, so a run with a
+budget (see budget.py) defers the least urgent writes to the backlog.
+
+Objects created by the plan itself are referred to as {"ref": <Notion page
+ID>} until the executor knows their (temp) Todoist ID.
+"""
+from notion_handler import (create_notion_task_async, update_notion_task_async,
+                            create_notion_project_async, update_notion_project_async,
+                            get_notion_project_by_todoist_id, get_notion_task_by_todoist_id, get_notion_project_by_id, get_notion_task_by_id,
+                            get_notion_project_id_by_todoist_id, get_notion_task_id_by_todoist_id,
+                            update_notion_pages, notion_state
+                            )
+from notion_writer import NotionWriter
+from todoist_handler import MAX_COMMANDS_PER_REQUEST
+from id_index import id_index
+from task_graph import task_levels
+from records import TodoistItem
+from fingerprints import (todoist_task_fingerprint, notion_task_fingerprint,
+                          todoist_project_fingerprint, notion_project_fingerprint)
+from metrics import metrics
+from snapshots import snapshots
+from budget import budget
+from config import NOTION_REQUESTS_PER_SECOND, logger
+from collections import Counter
+from dataclasses import asdict, replace
+import asyncio
+import json
+
+# Todoist commands are queued in this order, so every object exists before
+# a later command refers to it
+TODOIST_OPERATION_ORDER = ("project_add", "project_update", "item_uncomplete",
+                           "item_add", "item_move", "item_update", "item_complete")
+
+# Objects created in Todoist whose TodoistID never made it to Notion get
+# only that write-back
+NOTION_LINK_OPERATIONS = ("project_link", "item_link")
+
+# Operations whose result is written back to the Notion page
+NOTION_WRITE_BACKS = ("project_add", "item_add", "item_move") + NOTION_LINK_OPERATIONS
+
+
+def _new_plan(direction):
+    return {"direction": direction, "operations": [], "fingerprints": [],
+            "skipped": 0, "processed": 0, "errored": 0}
+
+
+def plan_notion_to_todoist(notion_tasks, notion_projects, todoist_api, backlog=None):
+    """Plans the Todoist commands that bring Notion changes over, most urgent first.
+
+    Pages in the backlog of the last run come before the others.
+    """
+    plan = _new_plan("notion_to_todoist")
+    operations = plan["operations"]
+    first_projects = backlog.pending["notion_projects"] if backlog else ()
+    first_tasks = backlog.pending["notion_tasks"] if backlog else ()
+
+    projects_index = {}  # Index to store Notion project ID and corresponding Todoist project ID
+    tasks_index = {}  # Index to store Notion task ID and corresponding Todoist task ID
+
+    for project in sorted(notion_projects, key=lambda project: project.notion_id not in first_projects):
+        # Skip projects whose synced fields haven't changed since the last sync
+        fingerprint = notion_project_fingerprint(project)
+        if project.todoist_id and id_index.get_fingerprint("project", "notion", project.todoist_id) == fingerprint:
+            projects_index[project.notion_id] = project.todoist_id
+            plan["skipped"] += 1
+            continue
+
+        if not project.todoist_id:
+            # A create whose TodoistID write-back was lost is in the ID index
+            todoist_id = id_index.get_todoist_id("project", project.notion_id)
+            if todoist_id and todoist_api.get_project(todoist_id):
+                operations.append({"type": "project_link", "id": todoist_id,
+                                   "notion_id": project.notion_id})
+                project = replace(project, todoist_id=todoist_id)
+
+        if not project.todoist_id:
+            # Create a new project in Todoist if it doesn't exist
+            operations.append({"type": "project_add", "ref": project.notion_id,
+                               "name": project.name, "notion_id": project.notion_id})
+            projects_index[project.notion_id] = {"ref": project.notion_id}
+        else:
+            # Get the project from Todoist
+            todoist_project = todoist_api.get_project(project.todoist_id)
+
+            # if project not found in Todoist, skip update
+            if not todoist_project:
+                logger.warning(
+                    f"Project {project.name} not found in Todoist. Skipping update.")
+                plan["skipped"] += 1
+                continue
+
+            # Update the project name in Todoist if it has changed
+            if project.name != todoist_project["name"]:
+                operations.append({"type": "project_update", "id": project.todoist_id,
+                                   "name": project.name, "notion_id": project.notion_id})
+
+            plan["fingerprints"].append(
+                ("project", "notion", project.todoist_id, fingerprint))
+            projects_index[project.notion_id] = project.todoist_id
+        plan["processed"] += 1
+
+    # Handle parents before their children, so a parent created by this plan
+    # already has its ref in tasks_index when a child needs it
+    levels, cycles, orphans = task_levels(
+        list(notion_tasks), "notion_id", "parent_id",
+        is_known=_notion_task_known if notion_state["tasks_complete"] else None)
+    _report_task_graph(cycles, orphans, "title")
+
+    for task in (task for level in levels for task in _by_priority(level, "notion_id", first_tasks)):
+
+        # Skip tasks whose synced fields haven't changed since the last sync
+        fingerprint = notion_task_fingerprint(task)
+        if task.todoist_id and id_index.get_fingerprint("task", "notion", task.todoist_id) == fingerprint:
+            tasks_index[task.notion_id] = task.todoist_id
+            plan["skipped"] += 1
+            continue
+
+        # Records are immutable: _task keeps the values as read from Notion,
+        # task gets the resolved Todoist IDs
+        _task = task
+
+        # skip if project_id is not defined
+        if not task.project_id:
+            logger.warning(
+                f"Project not found for task {task.title}. Skipping update. Please move the task to a project.")
+            plan["skipped"] += 1
+            continue
+
+        # Ensure todoist_project_id is defined, get it if not
+        if not task.todoist_project_id:
+            # Projects created by this plan are only known by their ref, so
+            # look in the index first
+            task = replace(task, todoist_project_id=projects_index.get(
+                task.project_id) or get_notion_project_by_id(task.project_id).todoist_id)
+            # Update the projects index
+            projects_index[task.project_id] = task.todoist_project_id
+
+        # check if project_id is not found in projects_index and get the project_id
+        if not projects_index.get(task.project_id):
+            projects_index[task.project_id] = get_notion_project_by_id(
+                task.project_id).todoist_id
+
+        # Ensure todoist_parent_id is defined, fetch it if not
+        if task.parent_id and not task.todoist_parent_id:
+            # check if parent_id is not found in tasks_index and get the parent_id
+            task = replace(task, todoist_parent_id=tasks_index.get(task.parent_id))
+
+            if not task.todoist_parent_id:
+                # Get the Todoist parent task ID from the Notion parent task ID
+                task = replace(task, todoist_parent_id=get_notion_task_by_id(
+                    task.parent_id).todoist_id)
+                # Update the tasks index
+                tasks_index[task.parent_id] = task.todoist_parent_id
+
+        # check if parent_id is not found in tasks_index and get the parent_id
+        if task.parent_id and not tasks_index.get(task.parent_id):
+            tasks_index[task.parent_id] = get_notion_task_by_id(
+                task.parent_id).todoist_id
+
+        # A create whose TodoistID write-back was lost is in the ID index
+        linked = False
+        if not task.todoist_id:
+            todoist_id = id_index.get_todoist_id("task", task.notion_id)
+            if todoist_id and todoist_api.get_task(todoist_id):
+                task = replace(task, todoist_id=todoist_id)
+                linked = True
+
+        if not task.todoist_id:
+            # Create a new task in Todoist if it doesn't exist
+            operations.append({
+                "type": "item_add",
+                "ref": task.notion_id,
+                "content": task.title,
+                "project_id": task.todoist_project_id,
+                "due": {"string": task.due_date} if task.due_date else None,
+                "priority": task.priority,
+                "parent_id": task.todoist_parent_id,
+                "notion_id": task.notion_id,
+            })
+            tasks_index[task.notion_id] = {"ref": task.notion_id}
+            plan["processed"] += 1
+            continue
+
+        # Get the task from Todoist
+        todoist_task = todoist_api.get_task(task.todoist_id)
+
+        # Handle cases where the task is not found in Todoist
+        if not todoist_task:
+            logger.warning(
+                f"Task {task.title} not found in Todoist. Skipping update.")
+            plan["skipped"] += 1
+            continue
+
+        # Separate status check
+        if task.status != get_todoist_task_status(todoist_task):
+            if task.status == "Done":
+                operations.append({"type": "item_complete",
+                                   "id": task.todoist_id, "notion_id": task.notion_id})
+            # Only uncomplete if the task was previously completed in Todoist
+            elif get_todoist_task_status(todoist_task) == "Done":
+                operations.append({"type": "item_uncomplete",
+                                   "id": task.todoist_id, "notion_id": task.notion_id})
+
+        # Move an item if the project or parent has changed
+        if _task.todoist_project_id != projects_index.get(_task.project_id) or _task.todoist_parent_id != tasks_index.get(_task.parent_id):
+            new_project_id = None
+            new_parent_id = None
+
+            if _task.todoist_project_id != projects_index.get(_task.project_id):
+                new_project_id = projects_index.get(task.project_id)
+
+            if _task.todoist_parent_id != tasks_index.get(_task.parent_id):
+                new_parent_id = tasks_index.get(task.parent_id)
+
+            operations.append({
+                "type": "item_move",
+                "id": task.todoist_id,
+                "project_id": new_project_id,
+                "parent_id": new_parent_id,
+                "notion_id": task.notion_id,
+            })
+        elif linked:
+            # A move writes the TodoistID back too; otherwise only write it
+            operations.append({"type": "item_link",
+                               "id": task.todoist_id, "notion_id": task.notion_id})
+
+        # Update properties if they have changed
+        if (task.title != todoist_task["content"] or
+            task.due_date != (todoist_task["due"]["date"] if todoist_task.get("due") else None) or
+                task.priority != todoist_task["priority"]):
+            operations.append({
+                "type": "item_update",
+                "id": task.todoist_id,
+                "content": task.title,
+                "due": {"date": task.due_date} if task.due_date else None,
+                "priority": task.priority,
+                "notion_id": task.notion_id,
+            })
+
+        plan["fingerprints"].append(
+            ("task", "notion", task.todoist_id, fingerprint))
+
+        # Update the tasks index
+        tasks_index[task.notion_id] = task.todoist_id
+        plan["processed"] += 1
+
+    return plan
+
+
+def execute_notion_to_todoist(plan, todoist_api, backlog=None):
+    """Queues the plan's Todoist commands, sends them and returns the final sync result.
+
+    With a backlog, the operations that don't fit the run's budget are
+    deferred to it.
+    """
+    if backlog is not None and budget.limited:
+        plan = _budget_notion_to_todoist(plan, todoist_api, backlog)
+    refs = {}  # Notion page ID -> (temp) Todoist ID of the objects created here
+
+    def resolve(value):
+        return refs[value["ref"]] if isinstance(value, dict) else value
+
+    operations = _by_type(plan["operations"])
+    for op in operations["project_add"]:
+        refs[op["ref"]] = todoist_api.add_project(
+            op["name"], notion_id=op["notion_id"])
+    for op in operations["project_update"]:
+        todoist_api.update_project(op["id"], name=op["name"])
+    for op in operations["item_uncomplete"]:
+        todoist_api.uncomplete_task(op["id"])
+    for op in operations["item_add"]:
+        refs[op["ref"]] = todoist_api.add_task(
+            content=op["content"],
+            project_id=resolve(op["project_id"]),
+            due=op["due"],
+            priority=op["priority"],
+            parent_id=resolve(op["parent_id"]),
+            notion_id=op["notion_id"],
+        )
+    for op in operations["item_move"]:
+        todoist_api.move_task(
+            op["id"],
+            project_id=resolve(op["project_id"]),
+            parent_id=resolve(op["parent_id"]),
+            notion_id=op["notion_id"],
+        )
+    for op in operations["item_update"]:
+        todoist_api.update_task(
+            op["id"], content=op["content"], due=op["due"], priority=op["priority"])
+    for op in operations["item_complete"]:
+        todoist_api.complete_task(op["id"])
+    update_notion_pages([
+        ("project" if op["type"] == "project_link" else "task", op["notion_id"],
+         {"TodoistID": {"rich_text": [{"text": {"content": op["id"]}}]}})
+        for op_type in NOTION_LINK_OPERATIONS for op in operations[op_type]])
+
+    metrics.count("notion_to_todoist", "skipped", plan["skipped"])
+    metrics.count("notion_to_todoist", "processed", plan["processed"])
+
+    # Final sync to execute commands and get updated data
+    final_sync_results = todoist_api.sync()
+
+    for kind, side, todoist_id, fingerprint in plan["fingerprints"]:
+        id_index.set_fingerprint(kind, side, todoist_id, fingerprint)
+
+    # Record the Todoist side of our own writes, so they are skipped when the
+    # changed objects come back in a sync response. The revisions are the
+    # ones returned with our commands: a user edit that lands after them
+    # doesn't match, and is synced
+    for project_id, project in todoist_api.written["projects"].items():
+        if project:
+            id_index.set_fingerprint("project", "todoist", project_id,
+                                     todoist_project_fingerprint(project))
+    for item_id, item in todoist_api.written["items"].items():
+        if item:
+            id_index.set_fingerprint("task", "todoist", item_id,
+                                     todoist_task_fingerprint(TodoistItem.from_api(item)))
+
+    snapshots.write("todoist_final_sync_result", final_sync_results)
+    return final_sync_results
+
+
+def _budget_notion_to_todoist(plan, todoist_api, backlog):
+    """Returns the plan cut down to the operations that fit the run's budget, deferring the rest."""
+    notion_room = budget.room("notion", NOTION_REQUESTS_PER_SECOND)
+    # The pass ends with the final sync request; commands queued before the
+    # plan (replayed from the journal) go out in the same batches
+    command_room = (budget.room("todoist") - 1) * \
+        MAX_COMMANDS_PER_REQUEST - len(todoist_api.commands)
+    notion_writes = 0
+    commands = 0
+    # Operations are in priority order and an object is always created
+    # before it is referred to, so the plan is cut after the last one that fits
+    for index, op in enumerate(plan["operations"]):
+        notion_writes += op["type"] in NOTION_WRITE_BACKS
+        commands += op["type"] in TODOIST_OPERATION_ORDER
+        if notion_writes > notion_room or commands > command_room:
+            break
+    else:
+        return plan
+
+    deferred = plan["operations"][index:]
+    deferred_pages = set()
+    deferred_todoist_ids = set()
+    for op in deferred:
+        kind = "notion_projects" if op["type"].startswith("project_") else "notion_tasks"
+        backlog.defer(kind, op["notion_id"])
+        deferred_pages.add(op["notion_id"])
+        if "id" in op:
+            deferred_todoist_ids.add(op["id"])
+    logger.warning(
+        f"Run budget left room for {index} of {len(plan['operations'])} Todoist operations; deferring {len(deferred_pages)} pages")
+    metrics.count("notion_to_todoist", "deferred", len(deferred_pages))
+    # Deferred objects keep their old fingerprints, so they are synced again
+    return dict(plan, operations=plan["operations"][:index],
+                fingerprints=[entry for entry in plan["fingerprints"]
+                              if entry[2] not in deferred_todoist_ids],
+                processed=plan["processed"] - len(deferred_pages))
+
+
+def plan_todoist_to_notion(todoist_state, backlog=None):
+    """Plans the Notion page writes that bring Todoist changes over, most urgent first.
+
+    Objects in the backlog of the last run come before the others.
+    """
+    plan = _new_plan("todoist_to_notion")
+    operations = plan["operations"]
+    first_projects = backlog.pending["todoist_projects"] if backlog else ()
+    first_items = backlog.pending["todoist_items"] if backlog else ()
+
+    for project in sorted(todoist_state["projects"], key=lambda project: project["id"] not in first_projects):
+        try:
+            # Skip projects whose synced fields haven't changed since the last sync
+            fingerprint = todoist_project_fingerprint(project)
+            if (id_index.get_fingerprint("project", "todoist", project["id"]) == fingerprint
+                    and get_notion_project_id_by_todoist_id(project["id"])):
+                plan["skipped"] += 1
+                continue
+
+            notion_project = get_notion_project_by_todoist_id(project["id"])
+            if not notion_project:
+                # Create a new project in Notion and set TodoistID
+                operations.append({"type": "project_create", "todoist_id": project["id"],
+                                   "name": project["name"], "fingerprint": fingerprint})
+            elif project["name"] != notion_project.name:
+                operations.append({"type": "project_update", "todoist_id": project["id"],
+                                   "page_id": notion_project.notion_id,
+                                   "name": project["name"], "fingerprint": fingerprint})
+            else:
+                plan["fingerprints"].append(
+                    ("project", "todoist", project["id"], fingerprint))
+                plan["skipped"] += 1
+        except Exception as e:
+            logger.error(f"Error syncing project {project['name']}: {e}")
+            plan["errored"] += 1
+
+    # Parents are written a level before their children, so a parent's new
+    # page ID is in the lookup tables by the time a child is written
+    items = [TodoistItem.from_api(item) for item in todoist_state["items"]]
+    levels, cycles, orphans = task_levels(
+        items,
+        is_known=lambda parent_id: bool(get_notion_task_id_by_todoist_id(parent_id)))
+    _report_task_graph(cycles, orphans, "content")
+
+    for level_number, level in enumerate(levels):
+        for task in _by_priority(level, "id", first_items):
+            try:
+                op = _plan_todoist_task(plan, task)
+                if op:
+                    op["level"] = level_number
+                    operations.append(op)
+                else:
+                    plan["skipped"] += 1
+            except Exception as e:
+                logger.error(f"Error syncing task {task.content}: {e}")
+                plan["errored"] += 1
+
+    return plan
+
+
+def _plan_todoist_task(plan, task):
+    """Returns the operation that writes a Todoist item to Notion, or None if it is unchanged."""
+    # Skip items whose synced fields haven't changed since the last sync
+    fingerprint = todoist_task_fingerprint(task)
+    if (id_index.get_fingerprint("task", "todoist", task.id) == fingerprint
+            and get_notion_task_id_by_todoist_id(task.id)):
+        return None
+
+    notion_task = get_notion_task_by_todoist_id(task.id)
+    task_status = "Done" if task.checked else "Not Started"
+
+    if not notion_task:
+        # Create a new task in Notion
+        return {"type": "task_create", "item": asdict(task), "fingerprint": fingerprint}
+
+    # Check for changes before updating
+    if (task.content != notion_task.title or
+        (task.due_date and task.due_date != notion_task.due_date) or
+            task_status != notion_task.status):
+        return {
+            "type": "task_update",
+            "page_id": notion_task.notion_id,
+            "item": asdict(task),
+            "fingerprint": fingerprint,
+        }
+
+    plan["fingerprints"].append(("task", "todoist", task.id, fingerprint))
+    return None
+
+
+def execute_todoist_to_notion(plan, backlog=None):
+    """Makes the plan's Notion writes.
+
+    With a backlog, the writes that don't fit the run's budget are deferred
+    to it.
+    """
+    for kind, side, todoist_id, fingerprint in plan["fingerprints"]:
+        id_index.set_fingerprint(kind, side, todoist_id, fingerprint)
+    metrics.count("todoist_to_notion", "skipped", plan["skipped"])
+    metrics.count("todoist_to_notion", "errored", plan["errored"])
+    deferred = asyncio.run(_write_plan_to_notion(
+        plan, limited=backlog is not None and budget.limited))
+
+    for op in deferred:
+        if op["type"].startswith("project_"):
+            backlog.defer("todoist_projects", op["todoist_id"])
+        else:
+            backlog.defer("todoist_items", op["item"]["id"])
+    if deferred:
+        logger.warning(
+            f"Run budget left room for {len(plan['operations']) - len(deferred)} of {len(plan['operations'])} Notion writes; deferring the rest")
+        metrics.count("todoist_to_notion", "deferred", len(deferred))
+
+
+async def _write_plan_to_notion(plan, limited=False):
+    """Writes projects concurrently, then tasks level by level, and returns the operations left out.
+
+    When limited, writes start a batch at a time and stop once the run's
+    budget is used up.
+    """
+    project_ops = [op for op in plan["operations"]
+                   if op["type"] in ("project_create", "project_update")]
+    levels = {}
+    for op in plan["operations"]:
+        if "level" in op:
+            levels.setdefault(op["level"], []).append(op)
+
+    deferred = []
+    async with NotionWriter() as writer:
+        for ops in [project_ops] + [levels[level_number] for level_number in sorted(levels)]:
+            # Once something is deferred, so is everything after it: the
+            # rest is lower priority or depends on it
+            if deferred:
+                deferred += ops
+                continue
+            batch_size = writer.concurrency * 4 if limited else max(len(ops), 1)
+            for start in range(0, len(ops), batch_size):
+                batch = ops[start:start + batch_size]
+                room = len(batch)
+                if limited:
+                    room = min(room, budget.room("notion", NOTION_REQUESTS_PER_SECOND))
+                if room:
+                    await _run_jobs(writer, _jobs(writer, batch[:room]))
+                if room < len(batch):
+                    deferred = ops[start + room:]
+                    break
+    return deferred
+
+
+def _jobs(writer, ops):
+    jobs = []
+    for op in ops:
+        if op["type"] in ("project_create", "project_update"):
+            jobs.append((f"project {op['name']}", _project_job(writer, op)))
+            continue
+        task = TodoistItem(**op["item"])
+        try:
+            jobs.append((f"task {task.content}", _task_job(writer, op, task)))
+        except Exception as e:
+            logger.error(f"Error syncing task {task.content}: {e}")
+            metrics.count("todoist_to_notion", "errored")
+    return jobs
+
+
+async def _run_jobs(writer, jobs):
+    errors = len(await writer.run_all(jobs))
+    metrics.count("todoist_to_notion", "processed", len(jobs) - errors)
+    metrics.count("todoist_to_notion", "errored", errors)
+
+
+def _project_job(writer, op):
+    if op["type"] == "project_create":
+        write = create_notion_project_async(
+            writer, {"id": op["todoist_id"], "name": op["name"]})
+    else:
+        write = update_notion_project_async(writer, op["page_id"], {
+            "Project name": {"title": [{"text": {"content": op["name"]}}]}})
+    return _recording_fingerprint(write, "project", op["todoist_id"], op["fingerprint"])
+
+
+def _task_job(writer, op, task):
+    """Returns the coroutine that makes a task operation, resolving its relations now."""
+    # Projects and parents written earlier in the plan are in the lookup
+    # tables by now
+    project_id = None
+    if task.project_id:
+        project_id = get_notion_project_id_by_todoist_id(task.project_id)
+
+    parent_id = None
+    if task.parent_id:
+        parent_id = get_notion_task_id_by_todoist_id(task.parent_id)
+
+    if op["type"] == "task_create":
+        write = create_notion_task_async(
+            writer, task, project_id, parent_id, task.project_id)
+    else:
+        properties = {
+            "Task name": {"title": [{"text": {"content": task.content}}]},
+        }
+        if task.due_date:
+            properties["Due"] = {
+                "date": {"start": task.due_date}}
+        if project_id:
+            properties["Project"] = {
+                "relation": [{"id": project_id}]}
+        if parent_id:
+            properties["Parent-task"] = {
+                "relation": [{"id": parent_id}]}
+
+        if task.checked:
+            properties["Status"] = {
+                "status": {"name": "Done"}
+            }
+        write = update_notion_task_async(writer, op["page_id"], properties)
+    return _recording_fingerprint(write, "task", task.id, op["fingerprint"])
+
+
+async def _recording_fingerprint(write, kind, todoist_id, fingerprint):
+    """Awaits a Notion write and records the Todoist-side fingerprint once it succeeded."""
+    result = await write
+    id_index.set_fingerprint(kind, "todoist", todoist_id, fingerprint)
+    return result
+
+
+def _by_priority(records, id_key, first=()):
+    """Orders records by urgency: those in first, then the soonest due (undated last), then the latest edited."""
+    records = sorted(records, key=lambda record: getattr(
+        record, "last_edited_time", None) or "", reverse=True)
+    return sorted(records, key=lambda record: (
+        getattr(record, id_key) not in first, record.due_date is None, record.due_date or ""))
+
+
+def _by_type(operations):
+    grouped = {op_type: []
+               for op_type in TODOIST_OPERATION_ORDER + NOTION_LINK_OPERATIONS}
+    for op in operations:
+        grouped[op["type"]].append(op)
+    return grouped
+
+
+def summarize_plan(plan):
+    """Returns a one-line count of a plan's operations by type."""
+    counts = Counter(op["type"] for op in plan["operations"])
+    operations = ", ".join(f"{op_type}={count}" for op_type, count in sorted(counts.items())) or "no writes"
+    return f"{plan['direction']}: {operations}; {plan['skipped']} unchanged"
+
+
+def save_plan(plans, path):
+    """Writes plans to a JSON file, or to stdout when path is "-"."""
+    if path == "-":
+        print(json.dumps(plans, indent=2))
+        return
+    with open(path, "w") as f:
+        json.dump(plans, f, indent=2)
+
+
+def _notion_task_known(notion_id):
+    return notion_id in notion_state["tasks_by_notion_id"]
+
+
+def _report_task_graph(cycles, orphans, name_key):
+    """Logs the parent loops and missing parents found while ordering tasks."""
+    for cycle in cycles:
+        names = " -> ".join(getattr(task, name_key) for task in cycle)
+        logger.warning(
+            f"Tasks {names} are each other's parents; syncing {getattr(cycle[0], name_key)} first")
+    for task in orphans:
+        logger.warning(
+            f"Parent of task {getattr(task, name_key)} is not in the synced databases")
+
+
+def get_todoist_task_status(task):
+    return "Done" if task["checked"] else "Not Started"
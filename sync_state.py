@@ -0,0 +1,139 @@
+"""Sync bookkeeping: the Todoist sync token, the Notion watermarks and the run ID.
+
+The state is kept as a single record, read once at the start of a run and
+written once at the end. SYNC_STATE_BACKEND picks where it lives: "notion"
+(one row of the variables database) or "file" (DATA_DIR/sync_state.json,
+no network at all).
+"""
+from datetime import datetime
+from notion_client import APIResponseError
+from notion_handler import notion, get_notion_variable
+from config import DATA_DIR, NOTION_VARIABLES_DB_ID, SYNC_STATE_BACKEND, logger
+import json
+import os
+
+# Name of the variables database row holding the whole state
+SYNC_STATE_VARIABLE = "sync_state"
+
+# Variables used before the state was kept as a single record
+LEGACY_VARIABLES = ("todoist_sync_token",
+                    "notion_task_last_updated", "notion_project_last_updated")
+
+
+def _default_state(state=None):
+    """Fills in the values a first run starts from."""
+    state = dict(state or {})
+    state["todoist_sync_token"] = state.get(
+        "todoist_sync_token") or "*"  # "*" means full sync
+    for name in ("notion_task_last_updated", "notion_project_last_updated"):
+        state[name] = state.get(name) or datetime.min.isoformat()
+    state.setdefault("run_id", None)
+    return state
+
+
+def _legacy_state():
+    logger.info("Migrating the sync state from the separate Notion variables")
+    return _default_state({name: get_notion_variable(name) for name in LEGACY_VARIABLES})
+
+
+def _write_json(path, data):
+    # Write then rename so a crash never leaves a partial file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class FileSyncStateStore:
+    """Keeps the sync state in a local JSON file."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DATA_DIR, "sync_state.json")
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return _legacy_state()
+        with open(self.path) as f:
+            return _default_state(json.load(f))
+
+    def save(self, state):
+        _write_json(self.path, state)
+
+
+class NotionSyncStateStore:
+    """Keeps the sync state as JSON in one row of the Notion variables database.
+
+    The row's page ID is remembered in a local file, so loading is a single
+    page read and saving a single page update.
+    """
+
+    def __init__(self, page_path=None):
+        self.page_path = page_path or os.path.join(
+            DATA_DIR, "sync_state_page.json")
+        self.page_id = None
+        if os.path.exists(self.page_path):
+            try:
+                with open(self.page_path) as f:
+                    self.page_id = json.load(f)["page_id"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def _read_page(self):
+        if self.page_id:
+            try:
+                page = notion.pages.retrieve(page_id=self.page_id)
+                if not page.get("archived"):
+                    return page
+            except APIResponseError as e:
+                logger.warning(
+                    f"Remembered sync state page {self.page_id} is gone: {e}")
+
+        response = notion.databases.query(
+            database_id=NOTION_VARIABLES_DB_ID,
+            filter={"property": "Name", "title": {
+                "equals": SYNC_STATE_VARIABLE}}
+        )
+        if not response["results"]:
+            return None
+        self._remember(response["results"][0]["id"])
+        return response["results"][0]
+
+    def _remember(self, page_id):
+        self.page_id = page_id
+        try:
+            _write_json(self.page_path, {"page_id": page_id})
+        except OSError as e:
+            logger.warning(f"Could not remember the sync state page: {e}")
+
+    def load(self):
+        page = self._read_page()
+        if not page:
+            return _legacy_state()
+        value = "".join(part["plain_text"]
+                        for part in page["properties"]["Value"]["rich_text"])
+        return _default_state(json.loads(value))
+
+    def save(self, state):
+        properties = {"Value": {"rich_text": [
+            {"text": {"content": json.dumps(state)}}]}}
+        if self.page_id:
+            try:
+                notion.pages.update(page_id=self.page_id,
+                                    properties=properties)
+                return
+            except APIResponseError as e:
+                logger.warning(
+                    f"Could not update sync state page {self.page_id}: {e}")
+
+        properties["Name"] = {
+            "title": [{"text": {"content": SYNC_STATE_VARIABLE}}]}
+        page = notion.pages.create(
+            parent={"database_id": NOTION_VARIABLES_DB_ID}, properties=properties)
+        self._remember(page["id"])
+
+
+def sync_state_store():
+    """Returns the store selected by SYNC_STATE_BACKEND."""
+    if SYNC_STATE_BACKEND == "file":
+        return FileSyncStateStore()
+    return NotionSyncStateStore()
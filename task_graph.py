@@ -0,0 +1,64 @@
+from collections import defaultdict
+
+
+def task_levels(tasks, id_key="id", parent_key="parent_id", is_known=None):
+    """Orders task records by their parent links so every parent comes before its children.
+
+    Returns a (levels, cycles, orphans) tuple:
+    - levels: lists of tasks, each depending only on tasks of earlier levels
+      or on parents outside the given tasks
+    - cycles: lists of tasks whose parent links form a loop; each loop is
+      broken at its first task, which is then treated as a top-level task
+    - orphans: tasks whose parent is neither among the given tasks nor
+      known according to is_known(parent_id), when is_known is given
+    """
+    tasks_by_id = {getattr(task, id_key): task for task in tasks}
+    children = defaultdict(list)
+    roots = []
+    orphans = []
+    for task in tasks:
+        parent_id = getattr(task, parent_key)
+        if parent_id in tasks_by_id:
+            children[parent_id].append(task)
+            continue
+        roots.append(task)
+        if parent_id and is_known and not is_known(parent_id):
+            orphans.append(task)
+
+    levels = []
+    visited = set()
+
+    def walk(level):
+        # Breadth-first from the given tasks, merging into the existing levels
+        depth = 0
+        while level:
+            if len(levels) <= depth:
+                levels.append([])
+            levels[depth].extend(level)
+            visited.update(getattr(task, id_key) for task in level)
+            level = [child for task in level for child in children[getattr(task, id_key)]
+                     if getattr(child, id_key) not in visited]
+            depth += 1
+
+    walk(roots)
+
+    # Whatever wasn't reached hangs below a loop of parent links
+    cycles = []
+    seen = set()
+    for task in tasks:
+        if getattr(task, id_key) in visited or getattr(task, id_key) in seen:
+            continue
+        path = []
+        positions = {}
+        task_id = getattr(task, id_key)
+        while task_id not in positions and task_id not in seen:
+            positions[task_id] = len(path)
+            path.append(tasks_by_id[task_id])
+            task_id = getattr(tasks_by_id[task_id], parent_key)
+        seen.update(positions)
+        if task_id in positions:
+            cycle = path[positions[task_id]:]
+            cycles.append(cycle)
+            walk([cycle[0]])
+
+    return levels, cycles, orphans
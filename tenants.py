@@ -0,0 +1,153 @@
+"""Syncs many Notion/Todoist account pairs from one process pool.
+
+The tenant file is a JSON list of tenants, each with a name (letters,
+digits, _ and -) and the environment variables of a single-account run (see .env):
+
+    [{"name": "alice",
+      "NOTION_TOKEN": "$ALICE_NOTION_TOKEN",
+      "TODOIST_API_TOKEN": "$ALICE_TODOIST_TOKEN",
+      "NOTION_TASKS_DB_ID": "...", "NOTION_PROJECTS_DB_ID": "...",
+      "NOTION_VARIABLES_DB_ID": "..."}]
+
+Values starting with "$" are read from this process's environment, so the
+file itself needs no secrets. Every tenant runs in a fresh process with its
+own clients, rate limits, ID index, journal and state under
+data/tenants/<name>/ (logs in data/tenants/<name>/logs/). A tenant that
+fails doesn't stop the others; a summary of all of them is printed at the
+end.
+
+Usage:
+    python tenants.py tenants.json [--processes N] [--summary-file summary.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Tenant names become directory names under the tenants root
+TENANT_NAME = re.compile(r"[A-Za-z0-9_-]+")
+
+# Variables every tenant has to define
+REQUIRED_KEYS = ("NOTION_TOKEN", "TODOIST_API_TOKEN", "NOTION_TASKS_DB_ID",
+                 "NOTION_PROJECTS_DB_ID", "NOTION_VARIABLES_DB_ID")
+
+
+def load_tenants(path):
+    """Reads the tenant file and returns the tenants, checking names and required variables."""
+    with open(path) as f:
+        tenants = json.load(f)
+    names = set()
+    for tenant in tenants:
+        name = tenant.get("name")
+        if not isinstance(name, str) or not TENANT_NAME.fullmatch(name) or name in names:
+            raise ValueError(
+                f"Tenant names must be unique and use only letters, digits, _ and -, got {name!r}")
+        names.add(name)
+        missing = [key for key in REQUIRED_KEYS if not tenant.get(key)]
+        if missing:
+            raise ValueError(f"Tenant {name} is missing {', '.join(missing)}")
+    return tenants
+
+
+def tenant_env(tenant, base_dir):
+    """Returns the environment variables of a tenant's run."""
+    env = {"DATA_DIR": os.path.join(base_dir, tenant["name"], "data")}
+    for key, value in tenant.items():
+        if key == "name":
+            continue
+        value = str(value)
+        if value.startswith("$"):
+            value = os.environ.get(value[1:], "")
+        env[key] = value
+    return env
+
+
+def sync_tenant(tenant, base_dir):
+    """Runs one sync pass for a tenant; called in a fresh worker process."""
+    started = time.perf_counter()
+    summary = {"name": tenant["name"], "ok": False, "changes": 0,
+               "seconds": 0.0, "items": {}, "error": None}
+    try:
+        # The modules read their configuration when they are imported, so
+        # the environment and working directory are set up first
+        env = tenant_env(tenant, base_dir)
+        workdir = os.path.dirname(env["DATA_DIR"])
+        os.makedirs(env["DATA_DIR"], exist_ok=True)
+        os.makedirs(os.path.join(workdir, "logs"), exist_ok=True)
+        os.environ.update(env)
+        os.chdir(workdir)
+        if REPO_DIR not in sys.path:
+            sys.path.insert(0, REPO_DIR)
+
+        from main import create_todoist_api, run_cycle
+        from sync_state import sync_state_store
+        from metrics import metrics
+
+        store = sync_state_store()
+        sync_state = store.load()
+        changes = run_cycle(create_todoist_api(), store, sync_state)
+        summary["ok"] = changes is not None
+        summary["changes"] = changes or 0
+        summary["items"] = metrics.to_dict()["items"]
+        if changes is None:
+            summary["error"] = "sync failed, see the tenant's log"
+    except Exception as e:
+        summary["error"] = f"{type(e).__name__}: {e}"
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def _sync_tenant(args):
+    return sync_tenant(*args)
+
+
+def run_tenants(tenants, processes=None, base_dir=None):
+    """Syncs all tenants in parallel and returns their summaries in file order."""
+    base_dir = os.path.abspath(base_dir or os.path.join("data", "tenants"))
+    # Spawned workers that run a single tenant each start from a clean
+    # interpreter, so no client or lookup table is shared between tenants
+    context = multiprocessing.get_context("spawn")
+    summaries = {}
+    with context.Pool(processes=min(processes or os.cpu_count(), len(tenants)) or 1,
+                      maxtasksperchild=1) as pool:
+        for summary in pool.imap_unordered(
+                _sync_tenant, [(tenant, base_dir) for tenant in tenants]):
+            status = "ok" if summary["ok"] else f"FAILED ({summary['error']})"
+            print(f"{summary['name']}: {status}, {summary['changes']} changes in {summary['seconds']}s",
+                  flush=True)
+            summaries[summary["name"]] = summary
+    return [summaries[tenant["name"]] for tenant in tenants]
+
+
+def print_summary(summaries, elapsed):
+    failed = [summary["name"] for summary in summaries if not summary["ok"]]
+    changes = sum(summary["changes"] for summary in summaries)
+    print(f"Synced {len(summaries) - len(failed)} of {len(summaries)} tenants "
+          f"({changes} changes) in {elapsed:.1f}s")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("tenant_file")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of tenants synced at a time (default: CPU count)")
+    parser.add_argument("--data-dir", default=None,
+                        help="directory for the tenants' state (default: data/tenants)")
+    parser.add_argument("--summary-file", help="write the summaries as JSON to this file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    summaries = run_tenants(load_tenants(args.tenant_file),
+                            args.processes, args.data_dir)
+    print_summary(summaries, time.perf_counter() - started)
+    if args.summary_file:
+        with open(args.summary_file, "w") as f:
+            json.dump(summaries, f, indent=2)
+    sys.exit(0 if all(summary["ok"] for summary in summaries) else 1)
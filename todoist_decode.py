@@ -0,0 +1,93 @@
+"""Decoding of Todoist Sync API responses down to the fields the sync reads.
+
+A full sync of a large account is several megabytes of JSON, most of it
+item fields the sync never looks at. Responses are decoded with msgspec
+into typed structs that only declare the used fields (everything else is
+skipped by the parser), or with orjson when msgspec is not installed, and
+with the standard json module otherwise. Either way the result is the
+usual dicts, so the rest of the sync doesn't care which decoder ran.
+"""
+import json
+from typing import Any, Dict, List, Optional
+from config import logger
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Only the fields of items and projects that the sync reads
+if msgspec:
+    class Due(msgspec.Struct):
+        date: Optional[str] = None
+
+    class Item(msgspec.Struct):
+        id: str
+        content: str = ""
+        project_id: Optional[str] = None
+        parent_id: Optional[str] = None
+        due: Optional[Due] = None
+        priority: int = 1
+        checked: bool = False
+        is_deleted: bool = False
+
+    class Project(msgspec.Struct):
+        id: str
+        name: str = ""
+        is_deleted: bool = False
+
+    class SyncResponse(msgspec.Struct):
+        sync_token: str
+        full_sync: bool = False
+        items: List[Item] = []
+        projects: List[Project] = []
+        temp_id_mapping: Dict[str, str] = {}
+        sync_status: Dict[str, Any] = {}
+
+    _sync_response_decoder = msgspec.json.Decoder(SyncResponse)
+
+
+def loads(content):
+    """Parses JSON bytes or text with the fastest available library."""
+    if orjson:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def decode_sync_response(content):
+    """Decodes the body of a /sync response into dicts holding only the used fields."""
+    if msgspec:
+        try:
+            return msgspec.to_builtins(_sync_response_decoder.decode(content))
+        except msgspec.ValidationError as e:
+            # An unexpected field type; the generic path copes with it
+            logger.warning(f"Falling back to generic decoding of a Todoist response: {e}")
+    return compact_sync_response(loads(content))
+
+
+def compact_sync_response(data):
+    """Strips the items and projects of a decoded /sync response down to the used fields."""
+    # The same fields as the Item and Project structs above
+    if "items" in data:
+        data["items"] = [{
+            "id": item["id"],
+            "content": item.get("content", ""),
+            "project_id": item.get("project_id"),
+            "parent_id": item.get("parent_id"),
+            "due": {"date": item["due"].get("date")} if item.get("due") else None,
+            "priority": item.get("priority", 1),
+            "checked": item.get("checked", False),
+            "is_deleted": item.get("is_deleted", False),
+        } for item in data["items"]]
+    if "projects" in data:
+        data["projects"] = [{
+            "id": project["id"],
+            "name": project.get("name", ""),
+            "is_deleted": project.get("is_deleted", False),
+        } for project in data["projects"]]
+    return data
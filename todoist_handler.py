@@ -1,118 +1,311 @@
-import requests
 import json
+import os
 import uuid
-from notion_handler import update_notion_task, update_notion_project
-from config import logger
+from notion_handler import update_notion_pages
+from id_index import id_index
+from journal import journal
+from transport import todoist_transport
+from snapshots import snapshots
+from todoist_decode import decode_sync_response, loads
+from config import TODOIST_API_URL, logger
+
+TODOIST_SYNC_URL = f"{TODOIST_API_URL}/sync/v9/sync"
+
+# The Sync API accepts at most 100 commands per request
+MAX_COMMANDS_PER_REQUEST = 100
+
+# Command arguments that may hold a temp_id of an object created earlier
+TEMP_ID_ARGS = ("id", "project_id", "parent_id")
+
+# Commands whose Todoist ID is written back to a Notion page, by the kind
+# used in the ID index
+CREATE_COMMANDS = {"project_add": "project", "item_add": "task"}
 
 
 class TodoistSync:
-    def __init__(self, api_token, sync_token="*"):
+    def __init__(self, api_token, sync_token="*", batch=False, state_path=None):
         self.api_token = api_token
         self.sync_token = sync_token
         self.commands = []
+        # In batch mode, create/complete/move commands are queued with the
+        # other commands and sent in chunks instead of one request each
+        self.batch = batch
+        self.temp_id_mapping = {}
+        self.notion_links = {}  # command uuid -> Notion page ID to update
+        # Projects and items known from sync responses, keyed by ID
+        self.projects = {}
+        self.items = {}
+        # The projects and items changed by our own commands, by ID, as
+        # returned in the response that applied the command
+        self.written = {"projects": {}, "items": {}}
+        # IDs of the objects created or moved by our commands whose Todoist ID
+        # could not be written back to their Notion page
+        self.unlinked = set()
+        # Every sync response received since the start of the run, including
+        # those of the intermediate command batches
+        self.received = []
+        # Local snapshot of the account that sync deltas are applied to
+        self.state_path = state_path
+
+    def load_state(self):
+        """Loads the local account snapshot and its sync token.
+
+        Returns False when there is no usable snapshot, in which case the
+        caller has to pick a sync token itself.
+        """
+        if not self.state_path or not os.path.exists(self.state_path):
+            return False
+        try:
+            with open(self.state_path, "rb") as f:
+                state = loads(f.read())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable Todoist state snapshot: {e}")
+            return False
+
+        self.sync_token = state["sync_token"]
+        self.projects = state["projects"]
+        self.items = state["items"]
+        logger.info(
+            f"Loaded Todoist state snapshot: {len(self.projects)} projects, {len(self.items)} items")
+        return True
+
+    def save_state(self):
+        """Writes the account snapshot and the current sync token to disk."""
+        if not self.state_path:
+            return
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "sync_token": self.sync_token,
+                "projects": self.projects,
+                "items": self.items,
+            }, f)
+        # Replace atomically so a crash never leaves a half-written snapshot
+        os.replace(tmp_path, self.state_path)
 
     def sync(self, resource_types=["projects", "items"]):
-        """Performs a synchronization with the Todoist API."""
+        """Performs a synchronization with the Todoist API, sending any queued commands."""
         logger.info("Full Syncing with Todoist API : " + self.sync_token)
+
+        while len(self.commands) > MAX_COMMANDS_PER_REQUEST:
+            self._send_commands(self._take_batch())
+
+        response_data = self._send_commands(self._take_batch(), resource_types)
+        journal.clear_done()
+        return response_data
+
+    def replay_journal(self):
+        """Queues the commands a previous run recorded but didn't finish.
+
+        Commands keep their uuid, so Todoist ignores the ones it already
+        applied. A create whose Notion page is already in the ID index did
+        reach Todoist; only its Todoist ID is written back to Notion again.
+        Returns the number of commands replayed.
+        """
+        unfinished = journal.unfinished()
+        if not unfinished:
+            return 0
+
+        logger.info(
+            f"Resuming {len(unfinished)} unfinished Todoist commands from the journal")
+        self.temp_id_mapping.update(journal.temp_id_mapping())
+        notion_updates = []
+        update_uuids = []
+        results = {}
+        for command, notion_id in unfinished:
+            kind = CREATE_COMMANDS.get(command["type"])
+            existing_id = kind and notion_id and id_index.get_todoist_id(
+                kind, notion_id)
+            if existing_id:
+                self.temp_id_mapping[command["temp_id"]] = existing_id
+                update = self._notion_id_update(command, notion_id, {})
+                if update:
+                    notion_updates.append(update)
+                    update_uuids.append(command["uuid"])
+                results[command["uuid"]] = existing_id
+                continue
+            if notion_id:
+                self.notion_links[command["uuid"]] = notion_id
+            self.commands.append(command)
+
+        self._finish(results, notion_updates, update_uuids)
+        return len(unfinished)
+
+    def flush(self):
+        """Sends all queued commands in batches of up to MAX_COMMANDS_PER_REQUEST."""
+        while self.commands:
+            self._send_commands(self._take_batch())
+
+    def _take_batch(self):
+        batch = self.commands[:MAX_COMMANDS_PER_REQUEST]
+        self.commands = self.commands[MAX_COMMANDS_PER_REQUEST:]
+        return batch
+
+    def _resolve_temp_ids(self, command):
+        """Replaces temp_ids of objects created in earlier batches with their real IDs."""
+        for key in TEMP_ID_ARGS:
+            value = command["args"].get(key)
+            if value in self.temp_id_mapping:
+                command["args"][key] = self.temp_id_mapping[value]
+
+    def _send_commands(self, commands, resource_types=["projects", "items"]):
+        """Sends a batch of commands with the incremental sync token and applies the results."""
+        for command in commands:
+            self._resolve_temp_ids(command)
+        if commands:
+            journal.mark_sent(commands)
+
         headers = {"Authorization": f"Bearer {self.api_token}"}
         data = {
             "sync_token": self.sync_token,
             "resource_types": json.dumps(resource_types),
-            "commands": json.dumps(self.commands),
+            "commands": json.dumps(commands),
         }
 
-        response = requests.post(
-            "https://api.todoist.com/sync/v9/sync", headers=headers, data=data
+        # Retries re-send the same command uuids, so they are idempotent
+        response = todoist_transport.post(
+            TODOIST_SYNC_URL, endpoint="todoist_sync", headers=headers, data=data
         )
 
-        if response.status_code == 200:
-            response_data = response.json()
-            self.sync_token = response_data["sync_token"]
-            self.commands = []  # Clear commands after successful sync
-
-            return response_data
-        else:
+        if response.status_code != 200:
             raise Exception(
                 f"Sync failed with status code: {response.status_code}")
 
+        # Large full syncs are decoded down to the fields the sync reads
+        response_data = decode_sync_response(response.content)
+        self.sync_token = response_data["sync_token"]
+        self._apply_resources(response_data)
+        self.received.append(response_data)
+
+        if not commands:
+            return response_data
+
+        snapshots.write("todoist_command_response", response_data)
+
+        self.temp_id_mapping.update(response_data.get("temp_id_mapping", {}))
+        sync_status = response_data.get("sync_status", {})
+        items = {item["id"]: item for item in response_data.get("items", [])}
+        returned = {"items": items, "projects": {
+            project["id"]: project for project in response_data.get("projects", [])}}
+
+        # Write the new Todoist IDs back to Notion once the whole batch is done
+        notion_updates = []
+        update_uuids = []
+        results = {}
+        for command in commands:
+            notion_id = self.notion_links.pop(command["uuid"], None)
+            status = sync_status.get(command["uuid"], "ok")
+            if status != "ok":
+                # Rejected commands would fail again, so they are finished too
+                logger.error(
+                    f"Todoist command {command['type']} failed: {status}")
+                results[command["uuid"]] = None
+                continue
+            written_id = self.temp_id_mapping.get(
+                command.get("temp_id"), command["args"].get("id"))
+            results[command["uuid"]] = written_id
+            if written_id:
+                kind = "projects" if command["type"].startswith("project_") else "items"
+                self.written[kind][written_id] = returned[kind].get(written_id)
+            if notion_id:
+                update = self._notion_id_update(command, notion_id, items)
+                if update:
+                    notion_updates.append(update)
+                    update_uuids.append(command["uuid"])
+        self._finish(results, notion_updates, update_uuids)
+
+        return response_data
+
+    def _finish(self, results, notion_updates, update_uuids):
+        """Writes the Todoist IDs back to Notion and marks the commands done.
+
+        Commands whose write-back failed stay sent, so the next run's journal
+        replay writes their IDs back again.
+        """
+        for index in update_notion_pages(notion_updates):
+            self.unlinked.add(results.pop(update_uuids[index]))
+        journal.mark_done(results)
+
+    def _apply_resources(self, response_data):
+        """Merges the projects and items of a sync response into the in-memory store."""
+        if response_data.get("full_sync"):
+            self.projects = {}
+            self.items = {}
+
+        for store, key in ((self.projects, "projects"), (self.items, "items")):
+            for resource in response_data.get(key, []):
+                if resource.get("is_deleted"):
+                    store.pop(resource["id"], None)
+                else:
+                    store[resource["id"]] = resource
+
+    def _notion_id_update(self, command, notion_id, items):
+        """Returns the Notion update storing the Todoist IDs of a created or moved object."""
+        args = command["args"]
+        new_id = self.temp_id_mapping.get(
+            command.get("temp_id"), args.get("id"))
+
+        if command["type"] == "project_add":
+            id_index.set("project", new_id, notion_id)
+            return ("project", notion_id, {"TodoistID": {
+                "rich_text": [{"text": {"content": new_id}}]}})
+        elif command["type"] == "item_add" or command["type"] == "item_move":
+
+            # get project and parent id from the returned item, or from the args
+            project_id = None
+            parent_id = None
+            if new_id in items:
+                project_id = items[new_id]["project_id"]
+                parent_id = items[new_id]["parent_id"]
+
+            if not project_id or not parent_id:
+                project_id = self.temp_id_mapping.get(
+                    args.get("project_id"), args.get("project_id"))
+                parent_id = self.temp_id_mapping.get(
+                    args.get("parent_id"), args.get("parent_id"))
+
+            properties = {"TodoistID": {
+                "rich_text": [{"text": {"content": new_id}}]},
+                "TodoistProjectID": {
+                    "rich_text": [{"text": {"content": project_id}}]
+            }}
+
+            if parent_id:
+                properties["TodoistParentID"] = {
+                    "rich_text": [{"text": {"content": parent_id}}]}
+
+            id_index.set("task", new_id, notion_id)
+            return ("task", notion_id, properties)
+
+        return None
+
     def _create_command(self, command_type, args, notion_id=None):
-        """Creates and executes a command directly without using the command queue."""
-        headers = {"Authorization": f"Bearer {self.api_token}"}
+        """Creates a command and executes it, or queues it in batch mode.
+
+        In batch mode the temp_id is returned in place of the new object's ID;
+        it can be used as project_id/parent_id by later commands and is
+        resolved when the batch is sent.
+        """
         command = {
             "type": command_type,
             "temp_id": str(uuid.uuid4()),
             "uuid": str(uuid.uuid4()),
             "args": args
         }
-        data = {
-            "sync_token": "*",  # Use "*" for immediate execution
-            "resource_types": json.dumps(["projects", "items"]),
-            "commands": json.dumps([command]),
-        }
-
-        response = requests.post(
-            "https://api.todoist.com/sync/v9/sync", headers=headers, data=data
-        )
-
-        if response.status_code == 200:
-            response_data = response.json()
-
-            # update sync token
-            self.sync_token = response_data["sync_token"]
-
-            json.dump(response_data, open(
-                "data/todoist_create_response_data.json", "w"), indent=2)
-
-            # Update Notion with the new ID
-            if notion_id:
-
-                temp_id = command["temp_id"]
-                new_id = response_data["temp_id_mapping"].get(
-                    temp_id, args.get("id"))
-
-                print("command_type : ", command_type)
-
-                if command_type == "project_add":
-                    update_notion_project(page_id=notion_id, properties={"TodoistID": {
-                        "rich_text": [{"text": {"content": new_id}}]}})
-                elif command_type == "item_add" or command_type == "item_move":
+        journal.record(command, notion_id)
+        if notion_id:
+            self.notion_links[command["uuid"]] = notion_id
 
-                    # get project id from response. filter out projecy_id from items
-                    project_id = None
-                    parent_id = None
-                    for item in response_data["items"]:
-                        if item["id"] == new_id:
-                            project_id = item["project_id"]
-                            parent_id = item["parent_id"]
-                            break
+        if self.batch:
+            self.commands.append(command)
+            if len(self.commands) >= MAX_COMMANDS_PER_REQUEST:
+                self.flush()
+            return command["temp_id"]
 
-                    if not project_id or not parent_id:
-                        # check if they exist in args
-                        project_id = args.get("project_id")
-                        parent_id = args.get("parent_id")
-
-                    print("Project ID : ", project_id)
-                    print("Parent ID : ", parent_id)
-
-                    properties = {"TodoistID": {
-                        "rich_text": [{"text": {"content": new_id}}]},
-                        "TodoistProjectID": {
-                            "rich_text": [{"text": {"content": project_id}}]
-                    }}
-
-                    if parent_id:
-                        properties["TodoistParentID"] = {
-                            "rich_text": [{"text": {"content": parent_id}}]}
-
-                    update_notion_task(page_id=notion_id,
-                                       properties=properties)
-
-                return new_id
-
-            return response_data
-        else:
-            raise Exception(
-                f"Command execution failed with status code: {response.status_code}")
+        response_data = self._send_commands([command])
+        if notion_id:
+            return self.temp_id_mapping.get(command["temp_id"], args.get("id"))
+        return response_data
 
     def add_project(self, name, notion_id=None):
         """Adds a project directly."""
@@ -158,6 +351,7 @@ class TodoistSync:
             command["args"]["parent_id"] = parent_id
         # ... (add other optional parameters as needed)
 
+        journal.record(command)
         self.commands.append(command)
 
     def update_project(self, project_id, name=None, color=None, collapsed=None, is_favorite=None, view_style=None):
@@ -174,19 +368,24 @@ class TodoistSync:
             command["args"]["color"] = color
         # ... (add other optional parameters as needed)
 
+        journal.record(command)
         self.commands.append(command)
 
     def get_project(self, project_id):
-        """Retrieves a project from Todoist."""
+        """Retrieves a project, from the sync state if known or else from Todoist."""
+        if project_id in self.projects:
+            return self.projects[project_id]
+
         headers = {"Authorization": f"Bearer {self.api_token}"}
         data = {"project_id": project_id}
 
-        response = requests.post(
-            "https://api.todoist.com/sync/v9/projects/get", headers=headers, data=data
+        response = todoist_transport.post(
+            f"{TODOIST_API_URL}/sync/v9/projects/get", endpoint="todoist_get", headers=headers, data=data
         )
 
         if response.status_code == 200:
             response_data = response.json()
+            self.projects[project_id] = response_data["project"]
             return response_data["project"]
         else:
             # raise Exception(
@@ -195,16 +394,20 @@ class TodoistSync:
             return None
 
     def get_task(self, task_id):
-        """Retrieves a task from Todoist."""
+        """Retrieves a task, from the sync state if known or else from Todoist."""
+        if task_id in self.items:
+            return self.items[task_id]
+
         headers = {"Authorization": f"Bearer {self.api_token}"}
         data = {"item_id": task_id}
 
-        response = requests.post(
-            "https://api.todoist.com/sync/v9/items/get", headers=headers, data=data
+        response = todoist_transport.post(
+            f"{TODOIST_API_URL}/sync/v9/items/get", endpoint="todoist_get", headers=headers, data=data
         )
 
         if response.status_code == 200:
             response_data = response.json()
+            self.items[task_id] = response_data["item"]
             return response_data["item"]
         else:
             # raise Exception(f"Failed to retrieve task: {response.status_code}")
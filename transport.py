@@ -0,0 +1,287 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import metrics
+from config import NOTION_REQUESTS_PER_SECOND, logger
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+# (connect, read) timeouts in seconds per endpoint
+TIMEOUTS = {
+    "todoist_sync": (5, 120),
+    "todoist_get": (5, 30),
+    "notion_query": (5, 60),
+    "notion_write": (5, 30),
+    "notion": (5, 30),
+}
+
+
+class RetryStats:
+    """Counts retries and the time spent waiting for them, across threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.wait_seconds = 0.0
+
+    def record(self, delay):
+        with self._lock:
+            self.retries += 1
+            self.wait_seconds += delay
+
+    def summary(self):
+        return f"{self.retries} retries, {self.wait_seconds:.1f}s spent backing off"
+
+
+retry_stats = RetryStats()
+
+
+def retry_delay(attempt, retry_after=None):
+    """Returns how long to wait before retry number attempt (0-based).
+
+    A Retry-After header (seconds or HTTP date) wins; otherwise the delay is
+    exponential with full jitter.
+    """
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(
+                    retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(max(delay, 0.0), BACKOFF_MAX_SECONDS)
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def _should_retry(status_code, attempt, idempotent=True):
+    if attempt >= MAX_RETRIES:
+        return False
+    if status_code == 429:
+        return True
+    return idempotent and status_code in RETRY_STATUSES
+
+
+def _should_retry_error(error, attempt, idempotent=True):
+    """Whether a request that failed without a response may be sent again."""
+    if attempt >= MAX_RETRIES:
+        return False
+    # A request that never reached the server can always be sent again;
+    # after a read timeout or a dropped connection it may have been applied
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    return idempotent
+
+
+class TodoistTransport:
+    """Pooled requests session with retries, used for every Todoist API call.
+
+    Sync commands carry their own uuid, so re-sending the same request body
+    after a failure is idempotent on Todoist's side.
+    """
+
+    def __init__(self, pool_size=10):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post(self, url, endpoint="todoist_sync", **kwargs):
+        """POSTs to the Todoist API, retrying 429/5xx responses and connection errors."""
+        name = url.split("/sync/v9/", 1)[-1]
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = self.session.post(
+                    url, timeout=TIMEOUTS[endpoint], **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.observe_request(
+                    "todoist", name, time.perf_counter() - started)
+                if attempt >= MAX_RETRIES:
+                    raise
+                delay = retry_delay(attempt)
+                logger.warning(
+                    f"Todoist request to {endpoint} failed ({e}), retrying in {delay:.1f}s")
+            else:
+                metrics.observe_request(
+                    "todoist", name, time.perf_counter() - started, response.status_code)
+                if not _should_retry(response.status_code, attempt):
+                    return response
+                delay = retry_delay(
+                    attempt, response.headers.get("Retry-After"))
+                logger.warning(
+                    f"Todoist request to {endpoint} returned {response.status_code}, retrying in {delay:.1f}s")
+            retry_stats.record(delay)
+            metrics.observe_retry("todoist", name, delay)
+            time.sleep(delay)
+            attempt += 1
+
+
+class RateLimiter:
+    """Token bucket shared across threads and event loops.
+
+    reserve() takes a token and returns how long the caller has to wait
+    before sending, so the wait happens outside the lock, with time.sleep or
+    asyncio.sleep.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens +
+                              (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(-self.tokens / self.rate, 0.0)
+
+
+# One Notion rate limit for the whole process (each tenant runs in its own):
+# queries, page reads and concurrent page writes all draw from it
+notion_limiter = RateLimiter(NOTION_REQUESTS_PER_SECOND)
+
+
+def _notion_request_info(request):
+    """Returns the (name, timeout endpoint, idempotent) triple for a Notion API request."""
+    parts = [part for part in request.url.path.split("/") if part][1:]
+    resource = parts[0] if parts else ""
+    if resource == "databases" and parts[-1] == "query":
+        return "databases.query", "notion_query", True
+    if resource == "pages" and request.method == "POST":
+        # Creating a page twice would duplicate it
+        return "pages.create", "notion_write", False
+    if resource == "pages" and request.method == "PATCH":
+        return "pages.update", "notion_write", True
+    if request.method == "GET" and len(parts) == 2:
+        return f"{resource}.retrieve", "notion", True
+    return f"{resource}.{request.method.lower()}", "notion", True
+
+
+def _notion_timeout(endpoint):
+    connect, read = TIMEOUTS[endpoint]
+    return {"connect": connect, "read": read, "write": read, "pool": read}
+
+
+class NotionRetryTransport(httpx.BaseTransport):
+    """httpx transport for the Notion client that adds the rate limit, retries and per-endpoint timeouts."""
+
+    def __init__(self, **kwargs):
+        self._transport = httpx.HTTPTransport(**kwargs)
+
+    def handle_request(self, request):
+        name, endpoint, idempotent = _notion_request_info(request)
+        request.extensions["timeout"] = _notion_timeout(endpoint)
+        attempt = 0
+        while True:
+            wait = notion_limiter.reserve()
+            if wait:
+                time.sleep(wait)
+            started = time.perf_counter()
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TransportError as e:
+                metrics.observe_request(
+                    "notion", name, time.perf_counter() - started)
+                if not _should_retry_error(e, attempt, idempotent):
+                    raise
+                delay = retry_delay(attempt)
+                logger.warning(
+                    f"Notion request to {endpoint} failed ({e}), retrying in {delay:.1f}s")
+            else:
+                # Latency up to the response headers; the body is read by the client
+                metrics.observe_request(
+                    "notion", name, time.perf_counter() - started, response.status_code)
+                if not _should_retry(response.status_code, attempt, idempotent):
+                    return response
+                delay = retry_delay(
+                    attempt, response.headers.get("Retry-After"))
+                response.read()
+                response.close()
+                logger.warning(
+                    f"Notion request to {endpoint} returned {response.status_code}, retrying in {delay:.1f}s")
+            retry_stats.record(delay)
+            metrics.observe_retry("notion", name, delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncNotionRetryTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of NotionRetryTransport, used by the NotionWriter."""
+
+    def __init__(self, **kwargs):
+        self._transport = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request):
+        name, endpoint, idempotent = _notion_request_info(request)
+        request.extensions["timeout"] = _notion_timeout(endpoint)
+        attempt = 0
+        while True:
+            wait = notion_limiter.reserve()
+            if wait:
+                await asyncio.sleep(wait)
+            started = time.perf_counter()
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError as e:
+                metrics.observe_request(
+                    "notion", name, time.perf_counter() - started)
+                if not _should_retry_error(e, attempt, idempotent):
+                    raise
+                delay = retry_delay(attempt)
+                logger.warning(
+                    f"Notion request to {endpoint} failed ({e}), retrying in {delay:.1f}s")
+            else:
+                # Latency up to the response headers; the body is read by the client
+                metrics.observe_request(
+                    "notion", name, time.perf_counter() - started, response.status_code)
+                if not _should_retry(response.status_code, attempt, idempotent):
+                    return response
+                delay = retry_delay(
+                    attempt, response.headers.get("Retry-After"))
+                await response.aread()
+                await response.aclose()
+                logger.warning(
+                    f"Notion request to {endpoint} returned {response.status_code}, retrying in {delay:.1f}s")
+            retry_stats.record(delay)
+            metrics.observe_retry("notion", name, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def notion_http_client():
+    """Returns a pooled httpx client with retries for the synchronous Notion client."""
+    return httpx.Client(transport=NotionRetryTransport())
+
+
+def notion_async_http_client():
+    """Returns a pooled httpx client with retries for the asynchronous Notion client."""
+    return httpx.AsyncClient(transport=AsyncNotionRetryTransport())
+
+
+todoist_transport = TodoistTransport()
@@ -0,0 +1,329 @@
+"""HTTP receiver for Todoist webhooks and Notion change notifications.
+
+Deliveries are checked against their signature, stored in a durable SQLite
+queue (duplicates are dropped by delivery/event ID) and synced in small
+batches through sync_logic, fetching only the records they touch.
+
+Usage:
+    python webhook_server.py [--host 0.0.0.0] [--port 8080]
+
+Todoist webhooks are posted to /todoist, Notion webhooks to /notion.
+"""
+from notion_client import APIResponseError
+from notion_handler import notion, parse_notion_task, parse_notion_project
+from sync_logic import sync_notion_to_todoist, sync_todoist_to_notion, merge_sync_results
+from main import create_todoist_api, save_sync_state
+from sync_state import sync_state_store
+from metrics import metrics
+from config import DATA_DIR, NOTION_TASKS_DB_ID, NOTION_PROJECTS_DB_ID, TODOIST_CLIENT_SECRET, NOTION_WEBHOOK_SECRET, logger
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import signal
+import sqlite3
+import threading
+import time
+
+# Events are synced in batches of up to BATCH_SIZE, collected for at most
+# BATCH_WINDOW seconds after the first one arrives
+BATCH_SIZE = 50
+BATCH_WINDOW = 2.0
+
+# Failed events are retried with the next batch, up to this many times
+MAX_ATTEMPTS = 5
+
+
+def sign_todoist_payload(body, secret):
+    """Returns the X-Todoist-Hmac-SHA256 header value for a request body."""
+    digest = hmac.new(secret.encode(), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode()
+
+
+def sign_notion_payload(body, secret):
+    """Returns the X-Notion-Signature header value for a request body."""
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(expected, signature):
+    return bool(signature) and hmac.compare_digest(expected, signature)
+
+
+class EventQueue:
+    """Durable queue of webhook events, keyed by their delivery or event ID."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS events (
+                event_id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                received_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS events_pending ON events (done, received_at)")
+        self.arrived = threading.Event()
+
+    def put(self, event_id, source, payload):
+        """Stores an event; returns False if it was already received."""
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO events (event_id, source, payload, received_at) VALUES (?, ?, ?, ?)",
+                (event_id, source, json.dumps(payload), time.time())
+            )
+        if cursor.rowcount:
+            self.arrived.set()
+        return bool(cursor.rowcount)
+
+    def pending(self, limit=BATCH_SIZE):
+        """Returns up to limit (event_id, source, payload) tuples, oldest first."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT event_id, source, payload FROM events WHERE done = 0 ORDER BY received_at LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [(event_id, source, json.loads(payload)) for event_id, source, payload in rows]
+
+    def mark_done(self, event_ids):
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE events SET done = 1 WHERE event_id = ?", [(event_id,) for event_id in event_ids])
+
+    def mark_failed(self, event_ids):
+        """Counts a failed attempt; events that failed MAX_ATTEMPTS times are dropped from the queue."""
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE events SET attempts = attempts + 1, done = (attempts + 1 >= ?) WHERE event_id = ?",
+                [(MAX_ATTEMPTS, event_id) for event_id in event_ids])
+
+    def purge(self, older_than=7 * 24 * 3600):
+        """Deletes handled events, keeping recent ones to recognise redeliveries."""
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM events WHERE done = 1 AND received_at < ?", (time.time() - older_than,))
+
+
+def _same_id(a, b):
+    return a.replace("-", "") == b.replace("-", "")
+
+
+def fetch_notion_pages(page_ids):
+    """Retrieves the given Notion pages and returns them as (tasks, projects)."""
+    tasks = []
+    projects = []
+    for page_id in page_ids:
+        try:
+            page = notion.pages.retrieve(page_id=page_id)
+        except APIResponseError as e:
+            logger.warning(f"Could not retrieve Notion page {page_id}: {e}")
+            continue
+        if page.get("archived"):
+            continue
+        database_id = page.get("parent", {}).get("database_id") or ""
+        if _same_id(database_id, NOTION_TASKS_DB_ID):
+            tasks.append(parse_notion_task(page))
+        elif _same_id(database_id, NOTION_PROJECTS_DB_ID):
+            projects.append(parse_notion_project(page))
+    return tasks, projects
+
+
+def process_events(todoist_api, store, events):
+    """Syncs a batch of (event_id, source, payload) events.
+
+    The Todoist sync token and snapshot are stored, so the next scheduled
+    run doesn't sync the same Todoist changes again. The Notion watermarks
+    are left to the scheduled runs: a Notion edit may come without an event
+    (no subscription, late or dropped deliveries), and the fingerprints make
+    reading the pages synced here again cheap.
+    """
+    # Retry the Notion write-backs that failed in the last batch; they go out
+    # with this batch's Todoist sync
+    if todoist_api.unlinked:
+        todoist_api.unlinked = set()
+        todoist_api.replay_journal()
+    todoist_api.received = []
+    todoist_projects = {}
+    todoist_items = {}
+    notion_page_ids = []
+    for event_id, source, payload in events:
+        if source == "todoist":
+            # Todoist events carry the whole object; later events win
+            data = payload.get("event_data") or {}
+            kind, _, action = payload.get("event_name", "").partition(":")
+            if action == "deleted" or data.get("is_deleted") or "id" not in data:
+                continue
+            if kind == "item":
+                todoist_items[data["id"]] = data
+            elif kind == "project":
+                todoist_projects[data["id"]] = data
+        elif source == "notion":
+            entity = payload.get("entity") or {}
+            if (entity.get("type") == "page" and payload.get("type") != "page.deleted"
+                    and entity["id"] not in notion_page_ids):
+                notion_page_ids.append(entity["id"])
+
+    metrics.reset()
+    notion_tasks, notion_projects = fetch_notion_pages(notion_page_ids)
+    logger.info(
+        f"Syncing {len(events)} webhook events: {len(notion_tasks) + len(notion_projects)} Notion pages, "
+        f"{len(todoist_items) + len(todoist_projects)} Todoist objects")
+
+    # The Todoist syncs of this pass also bring in any Todoist changes since
+    # the last one, which are then synced like the webhook ones
+    sync_notion_to_todoist(notion_tasks, notion_projects, todoist_api)
+    sync_todoist_to_notion(merge_sync_results(
+        {"projects": list(todoist_projects.values()),
+         "items": list(todoist_items.values())},
+        *todoist_api.received,
+        exclude=todoist_api.unlinked
+    ), prefetch=False)
+    # Read the state again so the watermarks of the scheduled runs are kept
+    save_sync_state(store, todoist_api, store.load())
+    try:
+        metrics.write()
+    except OSError as e:
+        logger.error(f"Could not write run metrics: {e}")
+
+
+def run_processor(queue, stop):
+    """Takes events off the queue in micro-batches until stop is set."""
+    store = sync_state_store()
+    todoist_api = create_todoist_api()
+    while not stop.is_set():
+        events = queue.pending()
+        if not events:
+            queue.arrived.wait(timeout=60)
+            queue.arrived.clear()
+            queue.purge()
+            continue
+        if len(events) < BATCH_SIZE:
+            # Give related events (e.g. a task and its subtasks) a moment to arrive
+            stop.wait(BATCH_WINDOW)
+            events = queue.pending()
+
+        event_ids = [event_id for event_id, source, payload in events]
+        try:
+            process_events(todoist_api, store, events)
+        except Exception as e:
+            logger.error(
+                f"Error syncing {len(events)} webhook events: {e}", exc_info=True)
+            queue.mark_failed(event_ids)
+            # The failed batch may have moved the sync token past Todoist
+            # changes it never synced; start again from the stored snapshot
+            todoist_api = create_todoist_api()
+            stop.wait(BATCH_WINDOW)
+        else:
+            queue.mark_done(event_ids)
+
+
+def make_handler(queue):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path == "/todoist":
+                self._todoist(body)
+            elif self.path == "/notion":
+                self._notion(body)
+            else:
+                self._send(404)
+
+        def _todoist(self, body):
+            if not TODOIST_CLIENT_SECRET or not verify_signature(
+                    sign_todoist_payload(body, TODOIST_CLIENT_SECRET), self.headers.get("X-Todoist-Hmac-SHA256")):
+                logger.warning("Rejected Todoist webhook with a bad signature")
+                return self._send(401)
+            payload = self._json(body)
+            if payload is None:
+                return self._send(400)
+            # Redeliveries keep their delivery ID
+            event_id = self.headers.get(
+                "X-Todoist-Delivery-ID") or hashlib.sha256(body).hexdigest()
+            if queue.put(f"todoist:{event_id}", "todoist", payload):
+                logger.info(f"Queued Todoist event {payload.get('event_name')}")
+            self._send(200)
+
+        def _notion(self, body):
+            # Parsed before the signature check: the verification request
+            # that sets up the secret is not signed
+            payload = self._json(body)
+            if payload is None:
+                return self._send(400)
+            if "verification_token" in payload:
+                # Sent once when the subscription is created; the token has
+                # to be entered in Notion and set as NOTION_WEBHOOK_SECRET
+                logger.info(
+                    f"Notion webhook verification token: {payload['verification_token']}")
+                return self._send(200)
+            if not NOTION_WEBHOOK_SECRET or not verify_signature(
+                    sign_notion_payload(body, NOTION_WEBHOOK_SECRET), self.headers.get("X-Notion-Signature")):
+                logger.warning("Rejected Notion webhook with a bad signature")
+                return self._send(401)
+            event_id = payload.get("id") or hashlib.sha256(body).hexdigest()
+            if queue.put(f"notion:{event_id}", "notion", payload):
+                logger.info(f"Queued Notion event {payload.get('type')}")
+            self._send(200)
+
+        def _json(self, body):
+            """Returns the JSON object of a request body, or None if it isn't one."""
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                payload = None
+            if not isinstance(payload, dict):
+                logger.warning("Rejected a webhook with a malformed body")
+                return None
+            return payload
+
+        def _send(self, status):
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(host="0.0.0.0", port=8080, queue_path=None):
+    """Runs the receiver and the batch processor until SIGTERM or Ctrl+C."""
+    queue = EventQueue(queue_path or os.path.join(
+        DATA_DIR, "webhook_queue.sqlite3"))
+    stop = threading.Event()
+    server = ThreadingHTTPServer((host, port), make_handler(queue))
+    server.daemon_threads = True
+
+    def request_stop(signum, frame):
+        logger.info(f"Received {signal.Signals(signum).name}, stopping")
+        stop.set()
+        queue.arrived.set()
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    processor = threading.Thread(
+        target=run_processor, args=(queue, stop), daemon=True)
+    processor.start()
+    logger.info(f"Listening for webhooks on {host}:{server.server_port}")
+    server.serve_forever()
+    server.server_close()
+    processor.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    serve(args.host, args.port)